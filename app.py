@@ -1,15 +1,93 @@
-from flask import Flask, jsonify, request,Response
+from flask import Flask, jsonify, request,Response, g
 from flask_cors import CORS
 import sqlite3
 import argparse
 import os
 import logging
 import math
-from data.db_config import DATABASE_FILES, DATASET_TABLES
+from data.db_config import (
+    DATABASE_FILES,
+    DATASET_TABLES,
+    ROW_COUNTS_TABLE,
+    COUNT_CACHE_MAX_ENTRIES,
+    COUNT_ESTIMATE_CAP,
+    SORT_MAX_COLUMNS,
+    SORT_TOPK_ROWS,
+    SORT_CACHE_MAX_ENTRIES,
+    EXPORT_BATCH_SIZE,
+    EXPORT_ROW_LIMIT,
+    EXPORT_INTERNAL_NETWORKS,
+    FTS_MIN_TERM_LENGTH,
+    SUGGEST_COLUMNS,
+    SUGGEST_MAX_LIMIT,
+    FACETS_TABLE,
+    FACETS_BY_GROUP_TABLE,
+    FACET_COLUMNS,
+    FACET_GROUP_COLUMNS,
+    BATCH_MAX_QUERIES,
+    BATCH_MAX_WORKERS,
+    REQUEST_TIMEOUT,
+    EXPORT_TIMEOUT,
+    SLOW_QUERY_THRESHOLD,
+    CATALOG_REFRESH_INTERVAL,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_EVICTION,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    PANEL_STORE_PATH,
+    PANEL_MAX_GENES,
+    PANEL_CACHE_ENTRIES,
+    SUMMARY_TABLE,
+    DATASET_SUMMARIES,
+    SUMMARY_MAX_PER_PAGE,
+    get_fts_table
+)
+from db_pool import QueryTimeout, get_pool
+from catalog import DatasetCatalog
+from filters import build_filters, in_condition
+from panels import PanelStore
+from response_cache import create_response_cache
+from metrics import (
+    QUERY_TIMEOUTS,
+    REQUEST_SECONDS,
+    finish_request,
+    log_slow_query,
+    record_stage,
+    render_metrics,
+    server_timing_header,
+    start_request,
+    timed
+)
+from serialization import (
+    SafeJSONProvider,
+    ARROW_MIMETYPE,
+    arrow_available,
+    columns_to_records,
+    encode_arrow_stream,
+    rows_to_columns,
+    serialize_columns,
+    serialize_rows
+)
 from werkzeug.middleware.proxy_fix import ProxyFix
 import sys
 import io
 import csv
+import json
+import base64
+import re
+import threading
+import zlib
+import ipaddress
+import bisect
+import hashlib
+import functools
+import contextvars
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.datastructures import MultiDict
 
 
 # Setup logging
@@ -22,6 +100,8 @@ parser.add_argument('--port', type=int, default=8000, help='Port to run the serv
 args = parser.parse_args(args=[] if 'gunicorn' in sys.argv[0] else None)
 
 app = Flask(__name__)
+# Encode NaN/Infinity as strings in the C JSON encoder instead of pre-scanning every value
+app.json = SafeJSONProvider(app)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
 # Enable CORS for all routes and origins
@@ -30,6 +110,54 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Track database availability
 available_datasets = {}
 
+# /api/data response formats and the query_data output layout each one uses
+RESPONSE_FORMATS = {'json': 'rows', 'columnar': 'columns', 'arrow': 'arrow'}
+
+# Sub-query types accepted by /api/batch
+BATCH_QUERY_TYPES = ('data', 'columns', 'facets')
+
+# Cached COUNT(*) results keyed by (dataset, normalized where clause, params)
+COUNT_MODES = ('exact', 'estimate', 'none')
+count_cache = OrderedDict()
+count_cache_versions = {}
+count_cache_lock = threading.Lock()
+
+# Rowids of the first SORT_TOPK_ROWS rows of an unindexed sort, keyed by
+# (dataset, db version, where clause, params, sort)
+sorted_rowid_cache = OrderedDict()
+# Whether an index serves a sorted page query, keyed by (dataset, db version, query)
+sort_plan_cache = OrderedDict()
+sort_cache_lock = threading.Lock()
+
+# Sorted distinct values for prefix suggestions, as (dataset, column) -> (db version, keys, values)
+suggest_indexes = {}
+suggest_lock = threading.Lock()
+
+# time.monotonic() deadline for the database work of the current request
+request_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+# Thread pool running /api/batch sub-queries, created per worker process
+batch_executor = None
+batch_executor_pid = None
+batch_executor_lock = threading.Lock()
+
+# Encoded JSON responses for the cached read endpoints
+response_cache_eviction = RESPONSE_CACHE_EVICTION
+if response_cache_eviction == 'ttl' and not RESPONSE_CACHE_TTL:
+    logger.warning("RNASEQ_CACHE_EVICTION=ttl needs RNASEQ_CACHE_TTL to be set; using lru eviction")
+    response_cache_eviction = 'lru'
+response_cache = create_response_cache(
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    path=RESPONSE_CACHE_PATH,
+    eviction=response_cache_eviction,
+    ttl=RESPONSE_CACHE_TTL
+)
+
+# Gene panels saved with POST /api/panels and referenced as ?panel=<id>
+panel_store = PanelStore(PANEL_STORE_PATH, PANEL_MAX_GENES, PANEL_CACHE_ENTRIES)
+
 def check_database_exists(db_path):
     """Check if database file exists"""
     return os.path.exists(db_path)
@@ -102,126 +230,582 @@ def initialize_databases():
                 create_sample_data()
 
             # Test connection
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            conn.close()
+            with db_connection(dataset_name) as conn:
+                conn.execute("SELECT 1").fetchone()
 
             available_datasets[dataset_name] = True
             logger.info(f"Successfully connected to {dataset_name} database")
+            dataset_catalog.refresh([dataset_name])
 
         except Exception as e:
             logger.error(f"Failed to initialize database {dataset_name}: {e}")
             available_datasets[dataset_name] = False
 
+def get_schema(dataset_name):
+    """Return the dataset's catalog entry (columns, types, indexes), or None if it is unavailable"""
+    if not available_datasets.get(dataset_name, False):
+        return None
+    entry = dataset_catalog.current(dataset_name)
+    if not entry or not entry.get('available'):
+        return None
+    return entry
+
 def get_table_columns(dataset_name):
     """Get column names for a dataset"""
-    try:
-        if not available_datasets.get(dataset_name, False):
-            return []
-
-        db_path = DATABASE_FILES[dataset_name]
-        table_name = DATASET_TABLES[dataset_name]
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Get column information using PRAGMA
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall()]  # row[1] is the column name
+    schema = get_schema(dataset_name)
+    return schema['columns'] if schema else []
+
+def db_connection(dataset_name, deadline=None):
+    """Pooled connection whose queries are interrupted once the request's deadline passes"""
+    return get_pool().connection(dataset_name, deadline=deadline or request_deadline.get())
+
+def get_db_version(dataset_name):
+    """Return an identifier for the current on-disk version of a dataset's database"""
+    st = os.stat(DATABASE_FILES[dataset_name])
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def normalize_where(where_sql):
+    """Collapse whitespace so equivalent where clauses share a cache key"""
+    return re.sub(r'\s+', ' ', where_sql).strip()
+
+def table_exists(conn, table_name):
+    """Whether a table exists in the connected database
+
+    Checked up front rather than by catching OperationalError, which would also
+    swallow a query interrupted at its request deadline.
+    """
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+    return row is not None
+
+def load_precomputed_counts(conn, dataset_name):
+    """Read the row counts written at ingest into cache entries"""
+    if not table_exists(conn, ROW_COUNTS_TABLE):
+        # Database was built before counts were precomputed
+        return {}
+    rows = conn.execute(f"SELECT where_clause, params, row_count FROM {ROW_COUNTS_TABLE}").fetchall()
+    return {
+        (dataset_name, normalize_where(where_clause), tuple(json.loads(params))): row_count
+        for where_clause, params, row_count in rows
+    }
 
-        conn.close()
-        return columns
-    except Exception as e:
-        logger.error(f"Error getting columns for {dataset_name}: {e}")
-        return []
+def precomputed_row_count(conn, dataset_name):
+    """Return the unfiltered row count written at ingest, or None"""
+    return load_precomputed_counts(conn, dataset_name).get((dataset_name, '', ()))
+
+def validate_count_cache(conn, dataset_name):
+    """Drop cached counts for a dataset whose database file has changed"""
+    version = get_db_version(dataset_name)
+    with count_cache_lock:
+        if count_cache_versions.get(dataset_name) == version:
+            return
+    precomputed = load_precomputed_counts(conn, dataset_name)
+    with count_cache_lock:
+        for key in [key for key in count_cache if key[0] == dataset_name]:
+            del count_cache[key]
+        count_cache.update(precomputed)
+        count_cache_versions[dataset_name] = version
+
+def count_rows(conn, dataset_name, where_sql, params, mode='exact'):
+    """Count rows matching a where clause, using the count cache
+
+    Returns (total, estimated). mode 'exact' runs COUNT(*) on a cache miss;
+    'estimate' avoids full scans by reading MAX(rowid) for unfiltered tables
+    and capping filtered counts at COUNT_ESTIMATE_CAP; 'none' skips counting.
+    """
+    if mode == 'none':
+        return None, False
+
+    validate_count_cache(conn, dataset_name)
+    key = (dataset_name, normalize_where(where_sql), tuple(params))
+    with count_cache_lock:
+        if key in count_cache:
+            count_cache.move_to_end(key)
+            return count_cache[key], False
+
+    table_name = DATASET_TABLES[dataset_name]
+    where = f" WHERE {where_sql}" if where_sql else ""
+
+    if mode == 'estimate':
+        if not where_sql:
+            total = conn.execute(f"SELECT MAX(rowid) FROM {table_name}").fetchone()[0] or 0
+            return total, True
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table_name}{where} LIMIT ?)",
+            list(params) + [COUNT_ESTIMATE_CAP]
+        ).fetchone()[0]
+        if total >= COUNT_ESTIMATE_CAP:
+            return total, True
+    else:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table_name}{where}", params).fetchone()[0]
+
+    with count_cache_lock:
+        count_cache[key] = total
+        while len(count_cache) > COUNT_CACHE_MAX_ENTRIES:
+            count_cache.popitem(last=False)
+    return total, False
+
+def get_column_types(dataset_name):
+    """Return {column name: SQLite type affinity} for a dataset from the schema catalog"""
+    schema = get_schema(dataset_name)
+    return schema['column_affinities'] if schema else {}
+
+def get_fts_columns(dataset_name):
+    """Return the columns covered by a dataset's trigram full-text index, if it has one"""
+    schema = get_schema(dataset_name)
+    return schema['fts_columns'] if schema else []
+
+def build_search_condition(dataset_name, column, term):
+    """Build a substring-search condition for a column
+
+    When the column is covered by the dataset's FTS5 trigram table, matching
+    rowids are looked up there first and LIKE only re-checks those candidates,
+    so results are identical to a plain LIKE without scanning the table.
+    Falls back to LIKE alone when the index is absent, the term is too short
+    for trigrams or the term contains LIKE wildcards.
+    """
+    like_clause = f"{column} LIKE ?"
+    pattern = f"%{term}%"
+    if len(term) < FTS_MIN_TERM_LENGTH or '%' in term or '_' in term:
+        return like_clause, [pattern]
+    if column not in get_fts_columns(dataset_name):
+        return like_clause, [pattern]
+
+    fts_table = get_fts_table(DATASET_TABLES[dataset_name])
+    phrase = '"' + term.replace('"', '""') + '"'
+    return (
+        f"rowid IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?) AND {like_clause}",
+        [f"{column} : {phrase}", pattern]
+    )
+
+def get_suggest_index(dataset_name, column):
+    """Return (keys, values) for a column: its distinct values sorted by upper-cased key
+
+    Built lazily on first use in each worker and rebuilt when the database file changes.
+    """
+    version = get_db_version(dataset_name)
+    cached = suggest_indexes.get((dataset_name, column))
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    with suggest_lock:
+        # Another thread may have rebuilt the index while we waited
+        cached = suggest_indexes.get((dataset_name, column))
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
 
-def query_data(dataset_name, search_term=None, search_column=None, page=1, per_page=10, where_clauses=None, where_params=None):
-    """Query data from database with optional filtering and pagination"""
+        table_name = DATASET_TABLES[dataset_name]
+        with db_connection(dataset_name) as conn:
+            rows = conn.execute(f"SELECT DISTINCT {column} FROM {table_name} WHERE {column} IS NOT NULL").fetchall()
+
+        pairs = []
+        for (value,) in rows:
+            value = str(value)
+            key = value.upper()
+            # Reuse the value object when it is already upper-case to halve memory
+            pairs.append((value if key == value else key, value))
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        values = [value for _, value in pairs]
+        suggest_indexes[(dataset_name, column)] = (version, keys, values)
+        logger.info(f"Built suggestion index for {dataset_name}.{column} with {len(values)} values")
+        return keys, values
+
+def suggest_values(dataset_name, column, prefix, limit=10):
+    """Return up to limit distinct values of a column starting with prefix (case-insensitive)"""
+    keys, values = get_suggest_index(dataset_name, column)
+    prefix = prefix.upper()
+    start = bisect.bisect_left(keys, prefix)
+    end = start
+    while end < len(keys) and end - start < limit and keys[end].startswith(prefix):
+        end += 1
+    return values[start:end]
+
+def get_gene_symbols_arg(args=None):
+    """Read gene_symbols from query arguments, given repeated or comma-separated
+
+    With panel=<id>, the genes of that stored panel (restricted to
+    gene_symbols, if also given); raises ValueError for an unknown panel.
+    """
+    args = request.args if args is None else args
+    gene_symbols_list = args.getlist('gene_symbols') or args.getlist('gene_symbols[]')
+    if len(gene_symbols_list) == 1:
+        gene_symbols_list = gene_symbols_list[0].split(',')
+    genes = [g.strip() for g in gene_symbols_list if g.strip()]
+    panel = args.get('panel', '').strip()
+    if panel:
+        panel_genes = panel_store.resolve(panel)['genes']
+        if genes:
+            selected = set(genes)
+            return [gene for gene in panel_genes if gene in selected]
+        return panel_genes
+    return genes
+
+def facet_counts(dataset_name, genes=None):
+    """Return {column: [{'value', 'count'}, ...]} for the dataset's facet columns
+
+    Counts come from the facet tables materialized at ingest; with a gene
+    filter the per-gene counts are summed. Databases built before facets were
+    materialized fall back to a GROUP BY on the data table.
+    """
+    table_name = DATASET_TABLES[dataset_name]
+    table_columns = set(get_table_columns(dataset_name))
+    facet_columns = [col for col in FACET_COLUMNS.get(dataset_name, []) if col in table_columns]
+    group_column = FACET_GROUP_COLUMNS.get(dataset_name)
+    if genes and group_column not in table_columns:
+        raise ValueError(f"{dataset_name} facets can't be filtered by gene")
+
+    facets = {col: [] for col in facet_columns}
+    if not facet_columns:
+        return facets
+
+    gene_clause, gene_params = in_condition('group_value', genes or [])
+    column_placeholders = ','.join('?' for _ in facet_columns)
+    with db_connection(dataset_name) as conn:
+        has_facet_tables = table_exists(conn, FACETS_BY_GROUP_TABLE if genes else FACETS_TABLE)
+        if has_facet_tables and genes:
+            rows = conn.execute(
+                f"SELECT column_name, value, SUM(row_count) FROM {FACETS_BY_GROUP_TABLE} "
+                f"WHERE column_name IN ({column_placeholders}) AND {gene_clause} "
+                "GROUP BY column_name, value ORDER BY column_name, value",
+                facet_columns + gene_params
+            ).fetchall()
+        elif has_facet_tables:
+            rows = conn.execute(
+                f"SELECT column_name, value, row_count FROM {FACETS_TABLE} "
+                f"WHERE column_name IN ({column_placeholders}) ORDER BY column_name, value",
+                facet_columns
+            ).fetchall()
+        else:
+            logger.warning(f"No facet tables in {dataset_name}; computing facets with GROUP BY")
+            where, where_params = "", []
+            if genes:
+                group_clause, where_params = in_condition(group_column, genes)
+                where = f" WHERE {group_clause}"
+            rows = []
+            for col in facet_columns:
+                rows.extend(
+                    (col, value, row_count) for value, row_count in conn.execute(
+                        f"SELECT {col}, COUNT(*) FROM {table_name}{where} GROUP BY {col} ORDER BY {col}",
+                        where_params
+                    )
+                )
+
+    for col, value, row_count in rows:
+        facets[col].append({'value': value, 'count': row_count})
+    return facets
+
+def summary_rows(dataset_name, args, page=1, per_page=100):
+    """Return a page of the dataset's summary table built at ingest, filtered like /api/data
+
+    Filters on columns the summary is not grouped by are ignored. Raises
+    LookupError if the database has no summary table.
+    """
+    schema = get_schema(dataset_name)
+    summary_columns = schema['summary_columns'] if schema else []
+    if not summary_columns:
+        raise LookupError(f'{dataset_name} has no summary table')
+    where_clauses, where_params = build_filters(dataset_name, args, set(summary_columns), panels=panel_store.resolve)
+    where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    order = ', '.join(quote_identifier(col) for col in DATASET_SUMMARIES[dataset_name]['group_by'])
+
+    with db_connection(dataset_name) as conn:
+        with timed('count', dataset_name):
+            total = conn.execute(f"SELECT COUNT(*) FROM {SUMMARY_TABLE}{where}", where_params).fetchone()[0]
+        with timed('page', dataset_name):
+            cursor = conn.execute(
+                f"SELECT * FROM {SUMMARY_TABLE}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                where_params + [per_page, (page - 1) * per_page]
+            )
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
+    with timed('serialize', dataset_name):
+        data = serialize_rows(rows, column_names, schema['summary_affinities'])
+    return {'data': data, 'total': total, 'page': page, 'per_page': per_page}
+
+def encode_cursor(rowid, sort=None, key=None):
+    """Encode a keyset pagination position as an opaque URL-safe token
+
+    Sorted pages also record the sort and the sort column values of the last
+    row, so the next page can seek past them.
+    """
+    payload = {'rowid': rowid}
+    if sort:
+        payload['sort'] = sort_key(sort)
+        payload['key'] = list(key)
+    payload = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(token, sort=None):
+    """Decode a pagination token into (rowid, sort key values); an empty token means the first page
+
+    Raises ValueError for a malformed token or one issued for a different sort.
+    """
+    if not token:
+        return 0, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        rowid = payload['rowid']
+        key = payload.get('key')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError('malformed cursor')
+    if not isinstance(rowid, int) or isinstance(rowid, bool):
+        raise ValueError('malformed cursor')
+    if payload.get('sort', '') != sort_key(sort or []):
+        raise ValueError('cursor was issued for a different sort')
+    if sort and (not isinstance(key, list) or len(key) != len(sort)
+                 or any(isinstance(value, (dict, list)) for value in key)):
+        raise ValueError('malformed cursor')
+    return rowid, key
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def parse_sort_arg(dataset_name, value):
+    """Parse sort=col:asc,col2:desc into [(column, 'ASC' or 'DESC'), ...]
+
+    Columns are checked against the schema catalog; the direction defaults to
+    ascending. Raises ValueError for unknown columns or directions.
+    """
+    sort = []
+    if not value or not value.strip():
+        return sort
+    columns = set(get_table_columns(dataset_name))
+    for item in value.split(','):
+        column, _, direction = item.strip().partition(':')
+        column = column.strip()
+        direction = direction.strip().lower() or 'asc'
+        if column not in columns:
+            raise ValueError(f'Column {column} not found in dataset')
+        if direction not in ('asc', 'desc'):
+            raise ValueError('sort direction must be asc or desc')
+        if any(existing == column for existing, _ in sort):
+            raise ValueError(f'Column {column} appears more than once in sort')
+        sort.append((column, direction.upper()))
+    if len(sort) > SORT_MAX_COLUMNS:
+        raise ValueError(f'sort accepts at most {SORT_MAX_COLUMNS} columns')
+    return sort
+
+def sort_key(sort):
+    """Canonical text of a sort, used in cursors and cache keys"""
+    return ','.join(f"{column}:{direction.lower()}" for column, direction in sort)
+
+def order_by_clause(sort):
+    """ORDER BY for a sort, with rowid as the last tie-breaker so pages are stable"""
+    terms = [f"{quote_identifier(column)} {direction}" for column, direction in sort]
+    return " ORDER BY " + ", ".join(terms + ["rowid"])
+
+def keyset_condition(sort, key, after_rowid):
+    """Condition selecting the rows after (key, after_rowid) in sort order
+
+    SQLite sorts NULLs first, so they precede every value ascending and follow
+    every value descending. An all-ascending sort past non-NULL values is one
+    row-value comparison, which the planner can seek an index with; other
+    sorts expand to the equivalent OR of prefix matches.
+    """
+    columns = [quote_identifier(column) for column, _ in sort]
+    if all(direction == 'ASC' for _, direction in sort) and None not in key:
+        placeholders = ', '.join('?' for _ in range(len(columns) + 1))
+        return f"({', '.join(columns)}, rowid) > ({placeholders})", list(key) + [after_rowid]
+
+    branches = []
+    params = []
+    prefix = []
+    prefix_params = []
+    for column, (_, direction), value in zip(columns, sort, key):
+        if direction == 'ASC':
+            after, after_params = (f"{column} IS NOT NULL", []) if value is None else (f"{column} > ?", [value])
+        else:
+            after, after_params = (None, []) if value is None else (f"({column} < ? OR {column} IS NULL)", [value])
+        if after:
+            branches.append("(" + " AND ".join(prefix + [after]) + ")")
+            params.extend(prefix_params + after_params)
+        prefix.append(f"{column} IS ?")
+        prefix_params.append(value)
+    branches.append("(" + " AND ".join(prefix + ["rowid > ?"]) + ")")
+    params.extend(prefix_params + [after_rowid])
+    return "(" + " OR ".join(branches) + ")", params
+
+def sort_uses_index(conn, dataset_name, query, params):
+    """Check whether the planner reads a sorted query's rows from an index in order, cached per query"""
+    key = (dataset_name, get_db_version(dataset_name), query)
+    with sort_cache_lock:
+        if key in sort_plan_cache:
+            sort_plan_cache.move_to_end(key)
+            return sort_plan_cache[key]
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+    # "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY" still reads the leading columns in index order
+    uses_index = 'USE TEMP B-TREE FOR ORDER BY' not in plan
+    with sort_cache_lock:
+        sort_plan_cache[key] = uses_index
+        while len(sort_plan_cache) > COUNT_CACHE_MAX_ENTRIES:
+            sort_plan_cache.popitem(last=False)
+    return uses_index
+
+def get_sorted_rowids(conn, dataset_name, where_sql, params, sort):
+    """Return the rowids of the first SORT_TOPK_ROWS matching rows in sort order
+
+    Runs as a single bounded top-k sort per filter and sort, then serves every
+    page within those rows from the cache.
+    """
+    key = (dataset_name, get_db_version(dataset_name), normalize_where(where_sql), tuple(params), sort_key(sort))
+    with sort_cache_lock:
+        if key in sorted_rowid_cache:
+            sorted_rowid_cache.move_to_end(key)
+            return sorted_rowid_cache[key]
+
+    table_name = DATASET_TABLES[dataset_name]
+    where = f" WHERE {where_sql}" if where_sql else ""
+    query = f"SELECT rowid FROM {table_name}{where}{order_by_clause(sort)} LIMIT ?"
+    with timed('sort', dataset_name) as sort_timer:
+        rowids = [row[0] for row in conn.execute(query, list(params) + [SORT_TOPK_ROWS])]
+    log_slow_query(conn, dataset_name, 'sort', query, list(params) + [SORT_TOPK_ROWS], sort_timer.elapsed,
+                   SLOW_QUERY_THRESHOLD)
+
+    with sort_cache_lock:
+        sorted_rowid_cache[key] = rowids
+        while len(sorted_rowid_cache) > SORT_CACHE_MAX_ENTRIES:
+            sorted_rowid_cache.popitem(last=False)
+    return rowids
+
+def fetch_rows_by_rowid(conn, table_name, rowids):
+    """Fetch rows in the order of rowids; returns (rows, column names)"""
+    placeholders = ','.join('?' for _ in rowids)
+    cursor = conn.execute(f"SELECT rowid AS _sort_rowid, * FROM {table_name} WHERE rowid IN ({placeholders})", rowids)
+    by_rowid = {row[0]: row[1:] for row in cursor.fetchall()}
+    column_names = [column[0] for column in cursor.description][1:]
+    return [by_rowid[rowid] for rowid in rowids if rowid in by_rowid], column_names
+
+def query_data(dataset_name, search_term=None, search_column=None, page=1, per_page=10, where_clauses=None, where_params=None, after_rowid=None, count='exact', output='rows', sort=None, after_key=None):
+    """Query data from database with optional filtering and pagination
+
+    By default pages are addressed with LIMIT/OFFSET. When after_rowid is given
+    the query seeks past that rowid instead (keyset pagination), so every page
+    costs the same regardless of depth, and the result carries a next_cursor.
+    The total is served from the count cache; see count_rows for count modes.
+
+    sort is a list of (column, direction) from parse_sort_arg; rowid breaks
+    ties. With a cursor, after_key holds the sort values of the previous
+    page's last row. Page-number requests for sorts no index serves are read
+    from a cached top-k list of rowids (see get_sorted_rowids).
+
+    output selects the layout of the rows: 'rows' returns a list of dicts under
+    'data', 'columns' returns a schema header plus one array per column, and
+    'arrow' returns the raw, unsanitized columns for encode_arrow_stream.
+    """
     try:
         if not available_datasets.get(dataset_name, False):
             return {'data': [], 'total': 0, 'error': 'Database not available'}
 
-        db_path = DATABASE_FILES[dataset_name]
         table_name = DATASET_TABLES[dataset_name]
+        keyset = after_rowid is not None
 
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
-        cursor = conn.cursor()
-
-        # Build base query
-        base_query = f"SELECT * FROM {table_name}"
-        count_query = f"SELECT COUNT(*) FROM {table_name}"
-
+        conditions = []
         params = []
         # Add search filter if provided and no where_clauses
         if where_clauses:
-            where_clause = " WHERE " + " AND ".join(where_clauses)
-            base_query += where_clause
-            count_query += where_clause
+            conditions.extend(where_clauses)
             params.extend(where_params if where_params else [])
         elif search_term and search_column:
-            where_clause = f" WHERE {search_column} LIKE ?"
-            base_query += where_clause
-            count_query += where_clause
-            params.append(f"%{search_term}%")
-
-        # Get total count
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
-
-        # Add pagination
-        offset = (page - 1) * per_page
-        base_query += f" LIMIT ? OFFSET ?"
-        params.extend([per_page, offset])
-
-        # Get data
-        cursor.execute(base_query, params)
-        rows = cursor.fetchall()
-
-        # Convert to list of dictionaries and ensure all values are properly serializable
-        data = []
-        for row in rows:
-            row_dict = dict(row)
-            # Ensure all values can be serialized to JSON
-            for key, value in row_dict.items():
-                if isinstance(value, bytes):
-                    row_dict[key] = value.decode('utf-8', errors='replace')
-                elif isinstance(value, float):
-                    # Handle infinity and NaN values with math module functions
-                    if math.isinf(value):
-                        row_dict[key] = "Infinity" if value > 0 else "-Infinity"
-                    elif math.isnan(value):
-                        row_dict[key] = "NaN"
-                    else:
-                        row_dict[key] = value
-                elif value is None:
-                    row_dict[key] = ""
-            data.append(row_dict)
+            search_clause, search_params = build_search_condition(dataset_name, search_column, search_term)
+            conditions.append(search_clause)
+            params.extend(search_params)
 
-        conn.close()
+        # Build base query
+        count_where = " AND ".join(conditions)
+        count_params = list(params)
+
+        if keyset:
+            page_conditions = list(conditions)
+            if not sort:
+                page_conditions.append("rowid > ?")
+                params.append(after_rowid)
+            elif after_key is not None:
+                seek_clause, seek_params = keyset_condition(sort, after_key, after_rowid)
+                page_conditions.append(seek_clause)
+                params.extend(seek_params)
+            base_query = f"SELECT rowid AS _cursor_rowid, * FROM {table_name}"
+            if page_conditions:
+                base_query += " WHERE " + " AND ".join(page_conditions)
+            base_query += (order_by_clause(sort) if sort else " ORDER BY rowid") + " LIMIT ?"
+            # Fetch one extra row to know whether another page exists
+            params.append(per_page + 1)
+        else:
+            base_query = f"SELECT * FROM {table_name}"
+            if conditions:
+                base_query += " WHERE " + " AND ".join(conditions)
+            if sort:
+                base_query += order_by_clause(sort)
+            offset = (page - 1) * per_page
+            base_query += " LIMIT ? OFFSET ?"
+            params.extend([per_page, offset])
+
+        column_types = get_column_types(dataset_name)
+
+        with db_connection(dataset_name) as conn:
+            cursor = conn.cursor()
 
-        # Debug info to help diagnose issues
-        sample_data = data[:1] if data else {}
-        logger.info(f"Query for {dataset_name} returned {len(data)} rows with columns: {list(sample_data[0].keys()) if sample_data else 'none'}")
-
-        # Log if special values were encountered
-        has_special_values = any(
-            isinstance(v, str) and v in ("Infinity", "-Infinity", "NaN")
-            for item in data[:5]  # Check just first few rows
-            for k, v in item.items()
-        )
-        if has_special_values:
-            logger.info(f"Special numeric values (Infinity/NaN) detected in {dataset_name} dataset")
-
-        return {
-            'data': data,
-            'total': total,
-            'page': page,
-            'per_page': per_page
-        }
+            # Get total count
+            with timed('count', dataset_name) as count_timer:
+                total, total_estimated = count_rows(conn, dataset_name, count_where, count_params, count)
+            count_sql = f"SELECT COUNT(*) FROM {table_name}" + (f" WHERE {count_where}" if count_where else "")
+            log_slow_query(conn, dataset_name, 'count', count_sql, count_params, count_timer.elapsed, SLOW_QUERY_THRESHOLD)
+
+            # Get data; unindexed sorts read their page from the top-k rowids
+            topk = (sort and not keyset and offset + per_page <= SORT_TOPK_ROWS
+                    and not sort_uses_index(conn, dataset_name, base_query, params))
+            if topk:
+                rowids = get_sorted_rowids(conn, dataset_name, count_where, count_params, sort)
+            with timed('page', dataset_name) as page_timer:
+                if topk:
+                    rows, column_names = fetch_rows_by_rowid(conn, table_name, rowids[offset:offset + per_page])
+                else:
+                    cursor.execute(base_query, params)
+                    rows = cursor.fetchall()
+                    column_names = [column[0] for column in cursor.description]
+            log_slow_query(conn, dataset_name, 'page', base_query, params, page_timer.elapsed, SLOW_QUERY_THRESHOLD)
+
+        next_cursor = None
+        if keyset and len(rows) > per_page:
+            rows = rows[:per_page]
+            key = [rows[-1][column_names.index(column)] for column, _ in sort] if sort else None
+            next_cursor = encode_cursor(rows[-1][0], sort, key)
+
+        columns = rows_to_columns(rows, len(column_names))
+        if keyset:
+            # Drop the leading _cursor_rowid column
+            column_names = column_names[1:]
+            columns = columns[1:]
 
+        # Debug info to help diagnose issues
+        logger.debug(f"Query for {dataset_name} returned {len(rows)} rows")
+
+        with timed('serialize', dataset_name):
+            if output == 'columns':
+                schema, arrays = serialize_columns(columns, column_names, column_types)
+                result = {'format': 'columnar', 'schema': schema, 'columns': arrays}
+            elif output == 'arrow':
+                result = {'columns': columns, 'column_names': column_names, 'column_types': column_types}
+            else:
+                # Convert to dictionaries; NaN/Infinity are rendered by the JSON encoder
+                result = {'data': columns_to_records(columns, column_names, column_types)}
+
+        result['total'] = total
+        result['per_page'] = per_page
+        if sort:
+            result['sort'] = sort_key(sort)
+        if keyset:
+            result['next_cursor'] = next_cursor
+        else:
+            result['page'] = page
+        if total_estimated:
+            result['total_estimated'] = True
+        return result
+
+    except QueryTimeout:
+        QUERY_TIMEOUTS.inc(dataset=dataset_name)
+        logger.warning(f"Query on {dataset_name} timed out: where={count_where!r} params={count_params[:20]}")
+        raise
     except sqlite3.Error as e:
         logger.error(f"Database error for {dataset_name}: {e}")
         return {'data': [], 'total': 0, 'error': f'Database error: {str(e)}'}
@@ -229,6 +813,331 @@ def query_data(dataset_name, search_term=None, search_column=None, page=1, per_p
         logger.error(f"Unexpected error for {dataset_name}: {e}")
         return {'data': [], 'total': 0, 'error': f'Unexpected error: {str(e)}'}
 
+def sanitize_export_value(value):
+    """Render a database value the way query_data serializes it"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        if math.isnan(value):
+            return "NaN"
+    return value
+
+def iter_export_batches(dataset_name, where_clauses=None, where_params=None, row_limit=None, batch_size=EXPORT_BATCH_SIZE, deadline=None, sort=None):
+    """Yield the column names, then row batches, from a single database cursor
+
+    The pooled connection is held until the generator is exhausted or closed,
+    so callers must close it if they stop early. The generator outlives the
+    request, so its deadline is passed in explicitly. With a row limit, an
+    unindexed sort keeps only that many rows in SQLite's sorter.
+    """
+    table_name = DATASET_TABLES[dataset_name]
+    query = f"SELECT * FROM {table_name}"
+    params = list(where_params or [])
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    if sort:
+        query += order_by_clause(sort)
+    if row_limit is not None:
+        query += " LIMIT ?"
+        params.append(row_limit)
+
+    with db_connection(dataset_name, deadline=deadline) as conn:
+        cursor = conn.execute(query, params)
+        yield [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+def generate_export(columns, batches, delimiter=',', compress=False):
+    """Encode row batches as CSV/TSV bytes, optionally gzip-compressed on the fly"""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 selects the gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+
+    def flush():
+        chunk = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(chunk) if compressor else chunk
+
+    try:
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows([sanitize_export_value(value) for value in row] for row in rows)
+            chunk = flush()
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        batches.close()
+
+def is_internal_client(remote_addr):
+    """Check whether a client address belongs to EXPORT_INTERNAL_NETWORKS"""
+    try:
+        address = ipaddress.ip_address(remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in EXPORT_INTERNAL_NETWORKS)
+
+def build_data_filters(dataset, args):
+    """Translate query arguments into (where_clauses, where_params) for /api/data and /api/export
+
+    Column filters are compiled by the filter engine from DATASET_FILTERS and
+    region from DATASET_REGIONS; search and column add a substring search.
+    Raises ValueError for invalid filter values or an unknown search column.
+    """
+    schema = get_schema(dataset)
+    table_columns = get_table_columns(dataset)
+    # Databases built before the region index compare the interval columns instead
+    region_index = bool(schema and schema.get('region_index'))
+    where_clauses, where_params = build_filters(dataset, args, set(table_columns), panels=panel_store.resolve,
+                                                region_index=region_index)
+
+    search_term = args.get('search', '').strip()
+    search_column = args.get('column', '').strip()
+
+    # Validate search column if provided
+    if search_column and search_column not in table_columns:
+        raise ValueError(f'Column {search_column} not found in dataset')
+
+    if search_term and search_column:
+        search_clause, search_params = build_search_condition(dataset, search_column, search_term)
+        where_clauses.append(search_clause)
+        where_params.extend(search_params)
+    return where_clauses, where_params
+
+def run_data_query(dataset, args):
+    """Run the /api/data query described by query arguments
+
+    Returns (query_data result, response format); raises ValueError for invalid arguments.
+    """
+    # Get query parameters
+    page = int(args.get('page', 1))
+    per_page = int(args.get('per_page', 10))
+
+    # Validate parameters
+    if page < 1:
+        page = 1
+    if per_page < 1 or per_page > 100:  # Limit per_page to prevent abuse
+        per_page = 10
+
+    # Keyset pagination: passing `cursor` (empty for the first page) switches
+    # from page numbers to opaque next_cursor tokens
+    sort = parse_sort_arg(dataset, args.get('sort', ''))
+
+    cursor_token = args.get('cursor')
+    after_rowid, after_key = decode_cursor(cursor_token.strip(), sort) if cursor_token is not None else (None, None)
+
+    # How the total is computed: exact (cached), estimate or none
+    count = args.get('count', 'exact').strip().lower()
+    if count not in COUNT_MODES:
+        raise ValueError(f"count must be one of {', '.join(COUNT_MODES)}")
+
+    # Response layout: json (row objects), columnar (column arrays) or arrow (IPC stream)
+    output_format = args.get('format', 'json').strip().lower()
+    if output_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+
+    where_clauses, where_params = build_data_filters(dataset, args)
+    result = query_data(dataset, page=page, per_page=per_page,
+                        where_clauses=where_clauses, where_params=where_params, after_rowid=after_rowid,
+                        count=count, output=RESPONSE_FORMATS[output_format], sort=sort, after_key=after_key)
+    return result, output_format
+
+def batch_query_args(query):
+    """Flatten a /api/batch sub-query into the query arguments /api/data accepts"""
+    filters = query.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError('filters must be an object')
+    args = MultiDict()
+    for name, value in filters.items():
+        for item in (value if isinstance(value, list) else [value]):
+            args.add(name, str(item))
+    for name in ('page', 'per_page', 'cursor', 'count', 'format', 'sort'):
+        if query.get(name) is not None:
+            args[name] = str(query[name])
+    return args
+
+def run_batch_query(query):
+    """Run one /api/batch sub-query and return its result with a per-query status"""
+    if not isinstance(query, dict):
+        return {'error': 'Each query must be an object', 'status': 400}
+    dataset = query.get('dataset')
+    query_type = query.get('type', 'data')
+    if not isinstance(dataset, str) or not available_datasets.get(dataset, False):
+        return {'dataset': dataset, 'type': query_type, 'error': 'Dataset not found', 'status': 404}
+
+    # Sub-queries share the response cache, keyed by the query and the database file version
+    key = "batch:" + json.dumps(query, sort_keys=True, separators=(',', ':'))
+    version = get_db_version(dataset)
+    cached = response_cache.get(key, version)
+    if cached:
+        return json.loads(cached[1])
+
+    try:
+        args = batch_query_args(query)
+        if query_type == 'data':
+            if args.get('format', '').strip().lower() == 'arrow':
+                raise ValueError('format=arrow is not supported in batch queries')
+            result, _ = run_data_query(dataset, args)
+            if result.get('error'):
+                return {'dataset': dataset, 'type': query_type, 'error': result['error'], 'status': 500}
+        elif query_type == 'columns':
+            result = {'columns': get_table_columns(dataset)}
+        elif query_type == 'facets':
+            if not FACET_COLUMNS.get(dataset):
+                return {'dataset': dataset, 'type': query_type, 'status': 404,
+                        'error': f'Facets are not available for {dataset}'}
+            genes = get_gene_symbols_arg(args)
+            result = {'gene_symbols': genes, 'facets': facet_counts(dataset, genes)}
+        else:
+            raise ValueError(f"type must be one of {', '.join(BATCH_QUERY_TYPES)}")
+    except ValueError as e:
+        return {'dataset': dataset, 'type': query_type, 'error': f'Invalid parameter: {str(e)}', 'status': 400}
+    except QueryTimeout:
+        return {'dataset': dataset, 'type': query_type, 'error': QUERY_TIMEOUT_MESSAGE, 'status': 504}
+    except Exception as e:
+        logger.error(f"Error running batch query on {dataset}: {e}")
+        return {'dataset': dataset, 'type': query_type, 'error': 'Query failed', 'status': 500}
+
+    result.update({'dataset': dataset, 'type': query_type, 'status': 200})
+    response_cache.set(key, version, '', app.json.dumps(result).encode('utf-8'))
+    return result
+
+def run_batch_query_with_deadline(deadline, query):
+    """Run a batch sub-query on an executor thread under the request's deadline"""
+    request_deadline.set(deadline)
+    try:
+        return run_batch_query(query)
+    finally:
+        request_deadline.set(None)
+
+def get_batch_executor():
+    """Return this process's thread pool for batch sub-queries, creating it after a fork"""
+    global batch_executor, batch_executor_pid
+    with batch_executor_lock:
+        if batch_executor is None or batch_executor_pid != os.getpid():
+            batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+            batch_executor_pid = os.getpid()
+        return batch_executor
+
+def data_response(result, output_format, dataset=''):
+    """Encode a query_data result in the requested response format"""
+    with timed('encode', dataset):
+        if output_format == 'arrow':
+            metadata = {key: value for key, value in result.items() if key not in ('columns', 'column_names', 'column_types')}
+            body = encode_arrow_stream(result['columns'], result['column_names'], result['column_types'], metadata)
+            return Response(body, mimetype=ARROW_MIMETYPE)
+        return jsonify(result)
+
+def response_cache_key(dataset_name):
+    """Build a cache key from the request path and its normalized query arguments"""
+    args = sorted((key, tuple(values)) for key, values in request.args.lists())
+    return json.dumps([request.path, dataset_name, args], separators=(',', ':'))
+
+def cached_response(view):
+    """Serve a dataset view from the response cache, with strong ETags and 304s
+
+    Only successful responses are cached. Entries are tied to the database
+    file version, so they are invalidated when the file is replaced. The ETag
+    is a hash of the body, so every worker produces the same one.
+    """
+    @functools.wraps(view)
+    def wrapper(dataset, *args, **kwargs):
+        # Only JSON bodies are cached; binary formats go straight to the view
+        if not available_datasets.get(dataset, False) or request.args.get('format') == 'arrow':
+            return view(dataset, *args, **kwargs)
+
+        version = get_db_version(dataset)
+        key = response_cache_key(dataset)
+        cached = response_cache.get(key, version)
+        if cached:
+            etag, body = cached
+            response = Response(body, mimetype='application/json')
+        else:
+            response = app.make_response(view(dataset, *args, **kwargs))
+            if response.status_code != 200 or response.mimetype != 'application/json':
+                return response
+            body = response.get_data()
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            response_cache.set(key, version, etag, body)
+
+        response.set_etag(etag)
+        # Let browsers and nginx keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return wrapper
+
+QUERY_TIMEOUT_MESSAGE = 'The query took too long; narrow the filters and try again'
+
+def query_timeout_response():
+    return jsonify({'error': QUERY_TIMEOUT_MESSAGE}), 504
+
+@app.before_request
+def start_request_deadline():
+    """Give the request's database work REQUEST_TIMEOUT seconds"""
+    request_deadline.set(time.monotonic() + REQUEST_TIMEOUT if REQUEST_TIMEOUT else None)
+    # Threads don't survive the fork, so each worker starts its own catalog refresher
+    dataset_catalog.ensure_refresher()
+
+@app.teardown_request
+def clear_request_deadline(exc):
+    # Worker threads are reused, so don't leak the deadline into the next request
+    request_deadline.set(None)
+    finish_request()
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    start_request()
+
+def metrics_dataset_label(dataset_name):
+    """Return a dataset name taken from a request as a metrics label, or '' if it isn't a served dataset
+
+    Keeps made-up names in request paths from adding histogram series that
+    would live as long as the worker.
+    """
+    if dataset_name in DATASET_TABLES and available_datasets.get(dataset_name, False):
+        return dataset_name
+    return ''
+
+@app.after_request
+def add_server_timing(response):
+    """Report stage timings in a Server-Timing header and record the request once its response is written"""
+    start = g.get('request_start', time.perf_counter())
+    handled = time.perf_counter() - start
+    response.headers['Server-Timing'] = server_timing_header(finish_request(), handled)
+
+    dataset = metrics_dataset_label((request.view_args or {}).get('dataset'))
+    labels = {
+        'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+        'method': request.method,
+        'status': str(response.status_code)
+    }
+
+    def record_write():
+        total = time.perf_counter() - start
+        record_stage('write', total - handled, dataset)
+        REQUEST_SECONDS.observe(total, **labels)
+
+    response.call_on_close(record_write)
+    return response
+
+# Schema (columns, types, indexes) and row counts per dataset, loaded by initialize_databases
+dataset_catalog = DatasetCatalog(
+    DATABASE_FILES,
+    DATASET_TABLES,
+    connect=db_connection,
+    version_of=get_db_version,
+    precomputed_count=precomputed_row_count,
+    refresh_interval=CATALOG_REFRESH_INTERVAL
+)
+
 # Initialize databases when the module is imported
 logger.info("Initializing databases on module import...")
 initialize_databases()
@@ -242,9 +1151,18 @@ def index():
         'status': 'running',
         'endpoints': [
             '/api/health',
+            '/api/catalog',
             '/api/datasets',
             '/api/columns/<dataset>',
-            '/api/data/<dataset>'
+            '/api/data/<dataset>',
+            '/api/export/<dataset>',
+            '/api/suggest/<dataset>/<column>',
+            '/api/facets/<dataset>',
+            '/api/summary/<dataset>',
+            '/api/batch',
+            '/api/panels',
+            '/api/panels/<panel_id>',
+            '/api/metrics'
         ]
     })
 
@@ -259,6 +1177,7 @@ def get_datasets():
         return jsonify({'error': 'Failed to get datasets'}), 500
 
 @app.route('/api/columns/<dataset>', methods=['GET'])
+@cached_response
 def get_columns(dataset):
     """Get column names for a specific dataset"""
     try:
@@ -272,290 +1191,258 @@ def get_columns(dataset):
         return jsonify({'error': 'Failed to get columns'}), 500
 
 @app.route('/api/data/<dataset>', methods=['GET'])
+@cached_response
 def get_data(dataset):
     """Get data for a specific dataset with optional filtering and pagination"""
     try:
         if dataset not in available_datasets or not available_datasets[dataset]:
             return jsonify({'error': 'Dataset not found'}), 404
 
-        # Get query parameters
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-
-        # Validate parameters
-        if page < 1:
-            page = 1
-        if per_page < 1 or per_page > 100:  # Limit per_page to prevent abuse
-            per_page = 10
-
-        if dataset == 'mrsd_expression':
-            # Parse dataset-specific filters
-            gene_symbols_list = request.args.getlist('gene_symbols')
-            if gene_symbols_list:
-                genes = [g.strip() for g in gene_symbols_list if g.strip()]
-            else:
-                gene_symbols_str = request.args.get('gene_symbols', '').strip()
-                genes = [g.strip() for g in gene_symbols_str.split(',') if g.strip()]
-            target_count = request.args.get('target_count', '').strip()
-            sample_type = request.args.get('sample_type', '').strip()
-
-            where_clauses = []
-            where_params = []
+        if request.args.get('format', '').strip().lower() == 'arrow' and not arrow_available():
+            return jsonify({'error': 'Arrow output requires pyarrow on the server'}), 501
 
-            if genes:
-                placeholders = ','.join('?' for _ in genes)
-                # Use correct column name for gene symbol filtering
-                where_clauses.append(f"hgnc_symbol IN ({placeholders})")
-                where_params.extend(genes)
+        result, output_format = run_data_query(dataset, request.args)
 
-            if target_count:
-                where_clauses.append("target_count = ?")
-                where_params.append(target_count)
+        if 'error' in result and result['error']:
+            return jsonify({'error': result['error']}), 500
 
-            if sample_type:
-                where_clauses.append("sample_type = ?")
-                where_params.append(sample_type)
+        return data_response(result, output_format, dataset)
 
-            result = query_data(dataset, page=page, per_page=per_page, where_clauses=where_clauses, where_params=where_params)
-
-            if 'error' in result and result['error']:
-                return jsonify({'error': result['error']}), 500
-
-            return jsonify(result)
-
-        elif dataset == 'mrsd_splice':
-            # Parse filters for mrsd_splice
-            gene_symbols_list = (
-                    request.args.getlist('gene_symbols') or
-                    request.args.getlist('gene_symbols[]')
-            )
-            if gene_symbols_list:
-                genes = [g.strip() for g in gene_symbols_list if g.strip()]
-            else:
-                gene_symbols_str = request.args.get('gene_symbols', '').strip()
-                genes = [g.strip() for g in gene_symbols_str.split(',') if g.strip()]
-            target_count = request.args.get('target_count', '').strip()
-            sample_type = request.args.get('sample_type', '').strip()
-            percentage_junction_covered = request.args.get('percentage_junction_covered', '').strip()
-
-            where_clauses = []
-            where_params = []
-
-            if genes:
-                placeholders = ','.join('?' for _ in genes)
-                # Use correct column name for gene symbol filtering
-                where_clauses.append(f"hgnc_symbol IN ({placeholders})")
-                where_params.extend(genes)
-
-            if target_count:
-                where_clauses.append("target_count = ?")
-                where_params.append(target_count)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except QueryTimeout:
+        return query_timeout_response()
+    except Exception as e:
+        logger.error(f"Error getting data for {dataset}: {e}")
+        return jsonify({'error': 'Failed to get data'}), 500
 
-            if sample_type:
-                where_clauses.append("sample_type = ?")
-                where_params.append(sample_type)
 
-            if percentage_junction_covered:
-                try:
-                    pct_val = float(percentage_junction_covered)
-                    where_clauses.append("percentage_junction_covered = ?")
-                    where_params.append(pct_val)
-                except ValueError:
-                    return jsonify({'error': 'percentage_junction_covered must be a number'}), 400
+# CSV Export endpoint
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_csv(dataset):
+    """Stream matching rows as CSV (or TSV with format=tsv, gzip-compressed with gzip=1)"""
+    try:
+        if dataset not in available_datasets or not available_datasets[dataset]:
+            return jsonify({'error': 'Dataset not found'}), 404
 
-            result = query_data(dataset, page=page, per_page=per_page, where_clauses=where_clauses, where_params=where_params)
+        export_format = request.args.get('format', 'csv').strip().lower()
+        if export_format not in ('csv', 'tsv'):
+            return jsonify({'error': 'format must be csv or tsv'}), 400
+        compress = request.args.get('gzip', '').strip().lower() in ('1', 'true', 'yes')
 
-            if 'error' in result and result['error']:
-                return jsonify({'error': result['error']}), 500
+        # Set export limits: limit=0 means unlimited, which only internal clients may request
+        internal = is_internal_client(request.remote_addr)
+        try:
+            row_limit = int(request.args.get('limit', 0 if internal else EXPORT_ROW_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        if row_limit < 0:
+            return jsonify({'error': 'limit must not be negative'}), 400
+        if row_limit == 0:
+            row_limit = None if internal else EXPORT_ROW_LIMIT
+        elif not internal:
+            row_limit = min(row_limit, EXPORT_ROW_LIMIT)
+
+        # Filters, search and sort=col:asc,col2:desc, as on /api/data
+        try:
+            sort = parse_sort_arg(dataset, request.args.get('sort', ''))
+            where_clauses, where_params = build_data_filters(dataset, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Read the first batch up front so an empty result can still return a 404
+        deadline = time.monotonic() + EXPORT_TIMEOUT if EXPORT_TIMEOUT else None
+        batches = iter_export_batches(dataset, where_clauses, where_params, row_limit=row_limit, deadline=deadline,
+                                      sort=sort)
+        columns = next(batches)
+        first_batch = next(batches, None)
+        if first_batch is None:
+            batches.close()
+            return jsonify({'error': 'No data available for export'}), 404
 
-            return jsonify(result)
+        def all_batches():
+            try:
+                yield first_batch
+                yield from batches
+            finally:
+                batches.close()
+
+        delimiter = '\t' if export_format == 'tsv' else ','
+        filename = f"{dataset}.{export_format}" + ('.gz' if compress else '')
+        mimetype = 'application/gzip' if compress else f"text/{'tab-separated-values' if export_format == 'tsv' else 'csv'}"
+
+        # No Content-Length: the body is sent with chunked transfer encoding
+        return Response(generate_export(columns, all_batches(), delimiter, compress), mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Accel-Buffering": "no"
+        })
 
-        elif dataset == 'splice_vault':
-            # Default filter: canonical = 1
-            where_clauses = ['canonical = ?']
-            where_params = [1]
+    except QueryTimeout:
+        return query_timeout_response()
+    except Exception as e:
+        logger.error(f"Error exporting CSV for {dataset}: {e}")
+        return jsonify({'error': 'Failed to export CSV'}), 500
 
-            search_term = request.args.get('search', '').strip()
-            search_column = request.args.get('column', '').strip()
+@app.route('/api/suggest/<dataset>/<column>', methods=['GET'])
+def suggest(dataset, column):
+    """Prefix autocomplete over the distinct values of a column"""
+    try:
+        if dataset not in available_datasets or not available_datasets[dataset]:
+            return jsonify({'error': 'Dataset not found'}), 404
+        if column not in SUGGEST_COLUMNS.get(dataset, []):
+            return jsonify({'error': f'Suggestions are not available for column {column}'}), 404
 
-            if search_term and search_column:
-                available_columns = get_table_columns(dataset)
-                if search_column not in available_columns:
-                    return jsonify({'error': f'Column {search_column} not found in dataset'}), 400
-                where_clauses.append(f"{search_column} LIKE ?")
-                where_params.append(f"%{search_term}%")
+        prefix = request.args.get('q', '').strip()
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > SUGGEST_MAX_LIMIT:
+            limit = 10
+        if not prefix:
+            return jsonify([])
 
-            result = query_data(dataset, page=page, per_page=per_page, where_clauses=where_clauses, where_params=where_params)
+        return jsonify(suggest_values(dataset, column, prefix, limit))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except QueryTimeout:
+        return query_timeout_response()
+    except Exception as e:
+        logger.error(f"Error getting suggestions for {dataset}.{column}: {e}")
+        return jsonify({'error': 'Failed to get suggestions'}), 500
 
-            if 'error' in result and result['error']:
-                return jsonify({'error': result['error']}), 500
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run several data, columns or facets queries concurrently and return all results
 
-            return jsonify(result)
+    The body is {"queries": [{"dataset": ..., "type": "data", "filters": {...},
+    "page": 1, "per_page": 10}, ...]}; results come back in the same order,
+    each with its own status.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        queries = payload.get('queries') if isinstance(payload, dict) else None
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'Request body must be {"queries": [...]} with at least one query'}), 400
+        if len(queries) > BATCH_MAX_QUERIES:
+            return jsonify({'error': f'At most {BATCH_MAX_QUERIES} queries per batch'}), 400
+
+        if len(queries) == 1:
+            results = [run_batch_query(queries[0])]
         else:
-            search_term = request.args.get('search', '').strip()
-            search_column = request.args.get('column', '').strip()
-
-            # Validate search column if provided
-            if search_column:
-                available_columns = get_table_columns(dataset)
-                if search_column not in available_columns:
-                    return jsonify({'error': f'Column {search_column} not found in dataset'}), 400
-
-            # Query data
-            result = query_data(dataset, search_term, search_column, page, per_page)
-
-            if 'error' in result and result['error']:
-                return jsonify({'error': result['error']}), 500
+            run = functools.partial(run_batch_query_with_deadline, request_deadline.get())
+            results = list(get_batch_executor().map(run, queries))
+        return jsonify({'results': results})
+    except Exception as e:
+        logger.error(f"Error running batch: {e}")
+        return jsonify({'error': 'Failed to run batch'}), 500
 
-            return jsonify(result)
+@app.route('/api/panels', methods=['POST'])
+def create_panel():
+    """Store a gene panel and return its id, for use as ?panel=<id>
 
+    The body is {"genes": ["BRCA1", ...]} or {"genes": "BRCA1\\nBRCA2"}; the
+    id is a hash of the sorted unique symbols, so saving a panel again
+    returns the same id.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict) or 'genes' not in payload:
+            return jsonify({'error': 'Request body must be {"genes": [...]}'}), 400
+        panel = panel_store.save(payload['genes'])
+        return jsonify({'panel': panel['id'], 'size': panel['size']}), 201
     except ValueError as e:
-        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+        return jsonify({'error': f'Invalid panel: {str(e)}'}), 400
     except Exception as e:
-        logger.error(f"Error getting data for {dataset}: {e}")
-        return jsonify({'error': 'Failed to get data'}), 500
+        logger.error(f"Error storing gene panel: {e}")
+        return jsonify({'error': 'Failed to store gene panel'}), 500
 
+@app.route('/api/panels/<panel_id>', methods=['GET'])
+def get_panel(panel_id):
+    """Return the genes of a stored gene panel"""
+    try:
+        panel = panel_store.get(panel_id)
+        if panel is None:
+            return jsonify({'error': 'Gene panel not found'}), 404
+        return jsonify({'panel': panel['id'], 'size': panel['size'], 'genes': panel['genes']})
+    except Exception as e:
+        logger.error(f"Error getting gene panel {panel_id}: {e}")
+        return jsonify({'error': 'Failed to get gene panel'}), 500
 
-# CSV Export endpoint
-@app.route('/api/export/<dataset>', methods=['GET'])
-def export_csv(dataset):
+@app.route('/api/facets/<dataset>', methods=['GET'])
+@cached_response
+def get_facets(dataset):
+    """Distinct values and row counts of the filter columns, optionally under a gene filter"""
     try:
         if dataset not in available_datasets or not available_datasets[dataset]:
             return jsonify({'error': 'Dataset not found'}), 404
-
-        # Set export limits
-        max_pages = 100
-        per_page = int(request.args.get('per_page', 10))
-        if per_page < 1 or per_page > 100:
-            per_page = 10
-
-        where_clauses = []
-        where_params = []
-
-        if dataset == 'splice_vault':
-            where_clauses.append('canonical = ?')
-            where_params.append(1)
-
-            search_term = request.args.get('search', '').strip()
-            search_column = request.args.get('column', '').strip()
-
-            if search_term and search_column:
-                available_columns = get_table_columns(dataset)
-                if search_column not in available_columns:
-                    return jsonify({'error': f'Column {search_column} not found in dataset'}), 400
-                where_clauses.append(f"{search_column} LIKE ?")
-                where_params.append(f"%{search_term}%")
-
-        elif dataset == 'mrsd_expression':
-            gene_symbols_list = request.args.getlist('gene_symbols')
-            if gene_symbols_list:
-                genes = [g.strip() for g in gene_symbols_list if g.strip()]
-            else:
-                gene_symbols_str = request.args.get('gene_symbols', '').strip()
-                genes = [g.strip() for g in gene_symbols_str.split(',') if g.strip()]
-            target_count = request.args.get('target_count', '').strip()
-            sample_type = request.args.get('sample_type', '').strip()
-
-            if genes:
-                placeholders = ','.join('?' for _ in genes)
-                where_clauses.append(f"hgnc_symbol IN ({placeholders})")
-                where_params.extend(genes)
-
-            if target_count:
-                where_clauses.append("target_count = ?")
-                where_params.append(target_count)
-
-            if sample_type:
-                where_clauses.append("sample_type = ?")
-                where_params.append(sample_type)
-
-        elif dataset == 'mrsd_splice':
-            gene_symbols_list = (
-                request.args.getlist('gene_symbols') or
-                request.args.getlist('gene_symbols[]')
-            )
-            if gene_symbols_list:
-                genes = [g.strip() for g in gene_symbols_list if g.strip()]
-            else:
-                gene_symbols_str = request.args.get('gene_symbols', '').strip()
-                genes = [g.strip() for g in gene_symbols_str.split(',') if g.strip()]
-            target_count = request.args.get('target_count', '').strip()
-            sample_type = request.args.get('sample_type', '').strip()
-            percentage_junction_covered = request.args.get('percentage_junction_covered', '').strip()
-
-            if genes:
-                placeholders = ','.join('?' for _ in genes)
-                where_clauses.append(f"hgnc_symbol IN ({placeholders})")
-                where_params.extend(genes)
-
-            if target_count:
-                where_clauses.append("target_count = ?")
-                where_params.append(target_count)
-
-            if sample_type:
-                where_clauses.append("sample_type = ?")
-                where_params.append(sample_type)
-
-            if percentage_junction_covered:
-                try:
-                    pct_val = float(percentage_junction_covered)
-                    where_clauses.append("percentage_junction_covered = ?")
-                    where_params.append(pct_val)
-                except ValueError:
-                    return jsonify({'error': 'percentage_junction_covered must be a number'}), 400
-
-        # Pull data in pages up to the max page limit
-        all_data = []
-        for page in range(1, max_pages + 1):
-            result = query_data(dataset, page=page, per_page=per_page, where_clauses=where_clauses, where_params=where_params)
-            if 'error' in result and result['error']:
-                return jsonify({'error': result['error']}), 500
-            all_data.extend(result['data'])
-            if len(result['data']) < per_page:
-                break
-
-        if not all_data:
-            return jsonify({'error': 'No data available for export'}), 404
-
-        # Write CSV to in-memory buffer
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=all_data[0].keys())
-        writer.writeheader()
-        writer.writerows(all_data)
-
-        output.seek(0)
-        return Response(output, mimetype='text/csv', headers={
-            "Content-Disposition": f"attachment; filename={dataset}.csv"
+        if not FACET_COLUMNS.get(dataset):
+            return jsonify({'error': f'Facets are not available for {dataset}'}), 404
+
+        genes = get_gene_symbols_arg()
+        return jsonify({
+            'dataset': dataset,
+            'gene_symbols': genes,
+            'facets': facet_counts(dataset, genes)
         })
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except QueryTimeout:
+        return query_timeout_response()
+    except Exception as e:
+        logger.error(f"Error getting facets for {dataset}: {e}")
+        return jsonify({'error': 'Failed to get facets'}), 500
 
+@app.route('/api/summary/<dataset>', methods=['GET'])
+@cached_response
+def get_summary(dataset):
+    """Per-gene summary rows (row count, min/median/max of each numeric column) materialized at ingest"""
+    try:
+        if dataset not in available_datasets or not available_datasets[dataset]:
+            return jsonify({'error': 'Dataset not found'}), 404
+        if dataset not in DATASET_SUMMARIES:
+            return jsonify({'error': f'Summaries are not available for {dataset}'}), 404
+
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = int(request.args.get('per_page', 100))
+        if per_page < 1 or per_page > SUMMARY_MAX_PER_PAGE:
+            per_page = 100
+
+        result = summary_rows(dataset, request.args, page, per_page)
+        result['dataset'] = dataset
+        result['group_by'] = DATASET_SUMMARIES[dataset]['group_by']
+        return jsonify(result)
+    except LookupError:
+        return jsonify({'error': f'{dataset} has no summary table; rebuild it with tsv_to_sql_all.py --indexes-only'}), 404
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except QueryTimeout:
+        return query_timeout_response()
     except Exception as e:
-        logger.error(f"Error exporting CSV for {dataset}: {e}")
-        return jsonify({'error': 'Failed to export CSV'}), 500
+        logger.error(f"Error getting summary for {dataset}: {e}")
+        return jsonify({'error': 'Failed to get summary'}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Request and query stage timings of this worker in the Prometheus text format"""
+    if not is_internal_client(request.remote_addr):
+        return jsonify({'error': 'Metrics are only available to internal clients'}), 403
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    dataset_info = {}
-    for name, status in available_datasets.items():
-        if status:
-            try:
-                columns = get_table_columns(name)
-                sample_data = query_data(name, per_page=1)
-                dataset_info[name] = {
-                    'columns': columns,
-                    'sample_row_keys': list(sample_data['data'][0].keys()) if sample_data['data'] else [],
-                    'row_count': sample_data['total']
-                }
-            except Exception as e:
-                dataset_info[name] = {'error': str(e)}
-
+    """Liveness check; answered from memory without touching the databases"""
     return jsonify({
         'status': 'healthy',
         'databases': [name for name, status in available_datasets.items() if status],
         'message': 'RNA-seq data viewer backend is running',
-        'dataset_info': dataset_info
+        'pool': get_pool().stats()
     })
 
+@app.route('/api/catalog', methods=['GET'])
+def catalog():
+    """Dataset metadata (columns, types, row counts, file version) from the in-memory catalog"""
+    snapshot = dataset_catalog.snapshot()
+    snapshot['response_cache'] = response_cache.stats()
+    return jsonify(snapshot)
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
@@ -577,9 +1464,17 @@ if __name__ == '__main__':
     print("Available datasets:", active_datasets)
     print("\nAPI Endpoints:")
     print(f"  GET http://localhost:{port}/api/health - Health check")
+    print(f"  GET http://localhost:{port}/api/catalog - Dataset columns, types and row counts")
     print(f"  GET http://localhost:{port}/api/datasets - List datasets")
     print(f"  GET http://localhost:{port}/api/columns/<dataset> - Get columns")
     print(f"  GET http://localhost:{port}/api/data/<dataset> - Get data")
+    print(f"  GET http://localhost:{port}/api/suggest/<dataset>/<column>?q=<prefix> - Autocomplete values")
+    print(f"  GET http://localhost:{port}/api/facets/<dataset> - Filter values with row counts")
+    print(f"  GET http://localhost:{port}/api/summary/<dataset> - Per-gene summaries")
+    print(f"  POST http://localhost:{port}/api/batch - Several queries in one request")
+    print(f"  POST http://localhost:{port}/api/panels - Save a gene panel")
+    print(f"  GET http://localhost:{port}/api/panels/<panel_id> - Get a saved gene panel")
+    print(f"  GET http://localhost:{port}/api/metrics - Request timings (Prometheus format)")
     print("\nPress Ctrl+C to stop the server\n")
 
     try:
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+"""
+Load test the API under gunicorn with a realistic mix of requests.
+
+Starts gunicorn (gthread workers by default, as in production) against a set
+of databases, e.g. ones made by generate_datasets.py, and replays a weighted
+mix of request classes from concurrent clients:
+
+  gene_panel   /api/data on mrsd_expression and mrsd_splice for 1-50 genes,
+               sometimes narrowed by sample_type or target_count
+  deep_page    /api/data page numbers deep into a dataset
+  cursor_page  /api/data keyset pages at a random position
+  search       splice_vault substring (LIKE / full-text) searches
+  region       /api/data overlap queries (chrom:start-end) on mrsd_splice and splice_vault
+  export       /api/export of a gene panel, capped at --export-limit rows
+  columns      /api/columns
+  health       /api/health
+
+Reports p50/p95/p99 latency and throughput per class and overall. The results
+can be saved with --save and compared with --baseline on a later run; the
+script exits with status 1 when a class's p95 or the overall throughput is
+worse than the baseline by more than --tolerance.
+
+Usage (from the project root):
+  python bench/generate_datasets.py --rows 1e6 --output bench/data
+  python bench/bench_api_load.py --data-dir bench/data --requests 5000 --concurrency 32 --save baseline.json
+  python bench/bench_api_load.py --data-dir bench/data --requests 5000 --concurrency 32 --baseline baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_response_cache import PROJECT_DIR, percentile, wait_for_server
+from generate_datasets import CHROMOSOMES, SAMPLE_TYPES, TARGET_COUNTS
+from data.db_config import DATASET_TABLES
+
+# Relative weight of each request class in the mix
+DEFAULT_MIX = {
+    'gene_panel': 40,
+    'deep_page': 10,
+    'cursor_page': 10,
+    'search': 15,
+    'region': 5,
+    'export': 5,
+    'columns': 5,
+    'health': 10
+}
+
+SEARCH_COLUMNS = ['gene_name', 'tx_id', 'event']
+
+
+def parse_mix(text):
+    """Parse 'class=weight,...' into a mix dict; unknown classes are an error"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown request class {name.strip()!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def load_dataset_info(data_dir):
+    """Read gene symbols, row counts and search values from the databases to build realistic requests"""
+    info = {}
+    for dataset, table_name in DATASET_TABLES.items():
+        db_path = os.path.join(data_dir, f"{dataset}.db")
+        if not os.path.exists(db_path):
+            raise SystemExit(f"{db_path} not found; generate it with bench/generate_datasets.py")
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+            symbol_column = 'hgnc_symbol' if 'hgnc_symbol' in columns else 'gene_name'
+            symbols = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT {symbol_column} FROM {table_name} LIMIT 5000")]
+            max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table_name}").fetchone()[0] or 0
+            tx_ids = []
+            if 'tx_id' in columns:
+                tx_ids = [row[0] for row in conn.execute(
+                    f"SELECT tx_id FROM {table_name} WHERE rowid % 997 = 0 LIMIT 1000")]
+        finally:
+            conn.close()
+        info[dataset] = {'columns': columns, 'symbols': symbols, 'rows': max_rowid, 'tx_ids': tx_ids}
+    return info
+
+
+def encode_cursor(rowid):
+    """Build a keyset pagination token the way the API's encode_cursor does"""
+    payload = json.dumps({'rowid': rowid}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def gene_panel_query(rng, symbols, max_genes=50):
+    panel = rng.sample(symbols, min(len(symbols), rng.randint(1, max_genes)))
+    return [('gene_symbols', symbol) for symbol in panel]
+
+
+def search_term(rng, info):
+    """Pick a substring of a real splice_vault value, as a user typing into the search box would"""
+    column = rng.choice(SEARCH_COLUMNS)
+    if column == 'tx_id' and info['tx_ids']:
+        value = rng.choice(info['tx_ids'])
+        return column, value[:rng.randint(8, len(value))]
+    if column == 'gene_name' and info['symbols']:
+        value = rng.choice(info['symbols'])
+        return column, value[:rng.randint(3, len(value))]
+    return 'event', rng.choice(['donor', 'acceptor', 'skipping', 'retention'])
+
+
+def build_request(request_class, rng, info, args):
+    """Build the path of one request of the given class"""
+    if request_class == 'health':
+        return '/api/health'
+    if request_class == 'columns':
+        return f"/api/columns/{rng.choice(list(DATASET_TABLES))}"
+    if request_class == 'search':
+        column, term = search_term(rng, info['splice_vault'])
+        query = [('column', column), ('search', term), ('page', rng.randint(1, 3)), ('per_page', 50)]
+        return f"/api/data/splice_vault?{urllib.parse.urlencode(query)}"
+    if request_class == 'region':
+        # Windows from a single exon to a gene cluster, over generate_datasets.py's coordinate range
+        start = rng.randint(1, 250000000)
+        region = f"{rng.choice(CHROMOSOMES)}:{start}-{start + rng.choice([1000, 10000, 100000, 1000000])}"
+        query = [('region', region), ('per_page', rng.choice([10, 50, 100]))]
+        return f"/api/data/{rng.choice(['mrsd_splice', 'splice_vault'])}?{urllib.parse.urlencode(query)}"
+
+    dataset = rng.choice(['mrsd_expression', 'mrsd_splice'])
+    if request_class in ('deep_page', 'cursor_page'):
+        dataset = rng.choice(list(DATASET_TABLES))
+    per_page = rng.choice([10, 50, 100])
+    rows = info[dataset]['rows']
+
+    if request_class == 'deep_page':
+        last_page = max(1, min(rows // per_page, args.max_page))
+        query = [('page', rng.randint(1, last_page)), ('per_page', per_page)]
+    elif request_class == 'cursor_page':
+        # Starting at a random rowid stands in for a client that has already walked that far
+        query = [('cursor', encode_cursor(rng.randint(0, max(rows - per_page, 0)))), ('per_page', per_page),
+                 ('count', 'none')]
+    else:
+        query = gene_panel_query(rng, info[dataset]['symbols'])
+        if rng.random() < 0.3:
+            query.append(('sample_type', rng.choice(SAMPLE_TYPES)))
+        if rng.random() < 0.2:
+            query.append(('target_count', rng.choice(TARGET_COUNTS)))
+        if request_class == 'export':
+            query.append(('limit', args.export_limit))
+            return f"/api/export/{dataset}?{urllib.parse.urlencode(query)}"
+        query.extend([('page', rng.randint(1, 5)), ('per_page', per_page)])
+    return f"/api/data/{dataset}?{urllib.parse.urlencode(query)}"
+
+
+def build_plan(info, args):
+    """Draw the sequence of (class, path) requests to send"""
+    rng = random.Random(args.seed)
+    classes = [name for name, weight in args.mix.items() if weight > 0]
+    weights = [args.mix[name] for name in classes]
+    return [(request_class, build_request(request_class, rng, info, args))
+            for request_class in rng.choices(classes, weights=weights, k=args.requests)]
+
+
+def fetch(base_url, path):
+    """Send one request and return (status, latency in ms, response bytes)"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=120) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as e:
+        size = len(e.read())
+        status = e.code
+    except OSError:
+        size = 0
+        status = 0
+    return status, (time.perf_counter() - start) * 1000, size
+
+
+def run_plan(base_url, plan, concurrency):
+    """Replay the plan from concurrent clients and return per-class samples and the elapsed time"""
+    samples = defaultdict(list)
+
+    def send(item):
+        request_class, path = item
+        return request_class, fetch(base_url, path)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for request_class, sample in pool.map(send, plan):
+            samples[request_class].append(sample)
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """Compute count, errors, throughput and latency percentiles per class and overall"""
+    def stats(entries):
+        latencies = [latency for _, latency, _ in entries]
+        return {
+            'requests': len(entries),
+            'errors': sum(1 for status, _, _ in entries if status == 0 or status >= 400),
+            'throughput': len(entries) / elapsed,
+            'mean_bytes': sum(size for _, _, size in entries) / len(entries),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99)
+        }
+
+    summary = {request_class: stats(entries) for request_class, entries in sorted(samples.items())}
+    summary['all'] = stats([entry for entries in samples.values() for entry in entries])
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'class':<13}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50':>11}{'p95':>11}{'p99':>11}{'avg size':>11}")
+    for request_class, result in summary.items():
+        print(f"{request_class:<13}{result['requests']:>9}{result['errors']:>8}{result['throughput']:>9.1f}"
+              f"{result['p50']:>9.1f}ms{result['p95']:>9.1f}ms{result['p99']:>9.1f}ms"
+              f"{result['mean_bytes'] / 1024:>9.1f}KB")
+
+
+def compare_to_baseline(summary, baseline, tolerance):
+    """Return a list of regressions: p95 latency up or overall throughput down by more than tolerance"""
+    regressions = []
+    for request_class, result in summary.items():
+        previous = baseline.get(request_class)
+        if not previous:
+            continue
+        if result['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append(f"{request_class}: p95 {previous['p95']:.1f}ms -> {result['p95']:.1f}ms")
+        if result['errors'] > previous['errors']:
+            regressions.append(f"{request_class}: errors {previous['errors']} -> {result['errors']}")
+    previous = baseline.get('all')
+    if previous and summary['all']['throughput'] < previous['throughput'] * (1 - tolerance):
+        regressions.append(f"throughput {previous['throughput']:.1f} -> {summary['all']['throughput']:.1f} req/s")
+    return regressions
+
+
+def start_server(args, data_dir):
+    env = dict(os.environ, RNASEQ_DATA_DIR=data_dir, RNASEQ_CACHE_BACKEND=args.cache_backend)
+    work_dir = tempfile.mkdtemp()
+    env['RNASEQ_CACHE_PATH'] = os.path.join(work_dir, 'response_cache.db')
+    # gunicorn.conf.py points at the production checkout, so start from an empty config
+    config_path = os.path.join(work_dir, 'gunicorn.conf.py')
+    open(config_path, 'w').close()
+    command = ['gunicorn', '-c', config_path, '-w', str(args.workers), '-k', args.worker_class,
+               '-b', f'127.0.0.1:{args.port}', '--timeout', '120', '--log-level', 'warning', 'app:app']
+    if args.worker_class == 'gthread':
+        command[1:1] = ['--threads', str(args.threads)]
+    return subprocess.Popen(command, cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL,
+                            stderr=None if args.server_log else subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the API endpoints under gunicorn')
+    parser.add_argument('--data-dir', default='data', help='Directory with the databases to serve (default: data)')
+    parser.add_argument('--url', help='Test an already running server at this base URL instead of starting one')
+    parser.add_argument('--requests', type=int, default=2000, help='Total requests (default: 2000)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16)')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (default: 4)')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker (default: 4)')
+    parser.add_argument('--worker-class', default='gthread', choices=['gthread', 'sync'],
+                        help='gunicorn worker class (default: gthread)')
+    parser.add_argument('--cache-backend', default='memory', choices=['memory', 'shared'],
+                        help='Response cache backend for the server (default: memory)')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Request class weights, e.g. gene_panel=50,search=50 (default: the built-in mix)')
+    parser.add_argument('--max-page', type=int, default=5000, help='Deepest page number requested (default: 5000)')
+    parser.add_argument('--export-limit', type=int, default=10000, help='Row limit of export requests')
+    parser.add_argument('--warmup', type=int, default=100, help='Requests sent before measuring (default: 100)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the request plan (default: 1)')
+    parser.add_argument('--port', type=int, default=8766, help='Port for the benchmark server')
+    parser.add_argument('--save', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against results saved earlier with --save')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative regression against the baseline (default: 0.2)')
+    parser.add_argument('--server-log', action='store_true', help='Show the gunicorn log')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    info = load_dataset_info(data_dir)
+    plan = build_plan(info, args)
+    datasets = ', '.join(f"{name} ({data['rows']:,} rows)" for name, data in info.items())
+    print(f"{args.requests:,} requests from {args.concurrency} clients against {datasets}")
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = start_server(args, data_dir)
+        base_url = f'http://127.0.0.1:{args.port}'
+        print(f"gunicorn: {args.workers} {args.worker_class} workers"
+              f"{f' x {args.threads} threads' if args.worker_class == 'gthread' else ''}, "
+              f"{args.cache_backend} response cache\n")
+    try:
+        wait_for_server(base_url)
+        if args.warmup:
+            warmup_args = argparse.Namespace(**{**vars(args), 'requests': args.warmup, 'seed': args.seed + 1})
+            run_plan(base_url, build_plan(info, warmup_args), args.concurrency)
+        samples, elapsed = run_plan(base_url, plan, args.concurrency)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(samples, elapsed)
+    print_summary(summary)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(summary, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%} of {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
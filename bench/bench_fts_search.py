@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark substring search on splice_vault: plain LIKE scan vs. FTS5 trigram index.
+
+Generates a synthetic splice_vault table, builds the full-text index with the
+same code as the ingest script, then times the page and count queries the API
+issues for a search with and without the index.
+
+Usage:
+  python bench/bench_fts_search.py --rows 5000000
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+from tsv_to_sql_all import build_fts_index
+from db_config import get_fts_table
+
+TABLE = 'splice_vault'
+EVENTS = ['exon_skipping', 'cryptic_donor', 'cryptic_acceptor', 'intron_retention']
+
+
+def generate_table(db_path, rows, batch_size=100000):
+    """Create a synthetic splice_vault table with the given number of rows"""
+    rng = random.Random(42)
+    genes = [f"GENE{i}" for i in range(20000)]
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(f"CREATE TABLE {TABLE} (tx_id TEXT, canonical INTEGER, gene_name TEXT, event TEXT, chrom TEXT, pos INTEGER)")
+    conn.execute(f"CREATE INDEX idx_{TABLE}_canonical_tx ON {TABLE} (canonical, tx_id)")
+    for start in range(0, rows, batch_size):
+        batch = [
+            (f"ENST{i:011d}", rng.randint(0, 1), rng.choice(genes), rng.choice(EVENTS),
+             f"chr{rng.randint(1, 22)}", rng.randint(1, 250000000))
+            for i in range(start, min(start + batch_size, rows))
+        ]
+        conn.executemany(f"INSERT INTO {TABLE} VALUES (?, ?, ?, ?, ?, ?)", batch)
+    # Ingest runs ANALYZE; without statistics the planner ignores the full-text rowids
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def search_queries(column, term, use_fts):
+    """Return (where clause, params) the way the API builds a splice_vault search"""
+    clauses = ["canonical = ?"]
+    params = [1]
+    if use_fts:
+        fts_table = get_fts_table(TABLE)
+        clauses.append(f"rowid IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)")
+        params.append(f'{column} : "{term}"')
+    clauses.append(f"{column} LIKE ?")
+    params.append(f"%{term}%")
+    return " AND ".join(clauses), params
+
+
+def time_query(conn, sql, params, repeat):
+    """Return the median wall time of a query in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LIKE vs. FTS5 trigram substring search')
+    parser.add_argument('--rows', type=int, default=2000000, help='Number of synthetic rows (default: 2,000,000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+    parser.add_argument('--db', help='Reuse or create the benchmark database at this path')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_splice_vault.db')
+    if not os.path.exists(db_path):
+        start = time.time()
+        generate_table(db_path, args.rows)
+        print(f"Generated {args.rows:,} rows in {time.time() - start:.1f} seconds")
+        start = time.time()
+        build_fts_index(db_path, TABLE, 'splice_vault')
+        print(f"Index build took {time.time() - start:.1f} seconds")
+
+    conn = sqlite3.connect(db_path)
+    total = conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+    print(f"\nDatabase: {db_path} ({total:,} rows)")
+    print(f"{'search':<32}{'matches':>10}{'LIKE page':>12}{'FTS page':>12}{'LIKE count':>12}{'FTS count':>12}")
+
+    cases = [('tx_id', '00001234'), ('tx_id', '99999'), ('gene_name', 'GENE1999'), ('event', 'donor'), ('chrom', 'chr22')]
+    for column, term in cases:
+        row = [f"{column} ~ {term}"]
+        for use_fts in (False, True):
+            where, params = search_queries(column, term, use_fts)
+            page_ms = time_query(conn, f"SELECT * FROM {TABLE} WHERE {where} LIMIT 10 OFFSET 0", params, args.repeat)
+            count_ms = time_query(conn, f"SELECT COUNT(*) FROM {TABLE} WHERE {where}", params, args.repeat)
+            row.append((page_ms, count_ms))
+        matches = conn.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE {search_queries(column, term, False)[0]}",
+                               search_queries(column, term, False)[1]).fetchone()[0]
+        (like_page, like_count), (fts_page, fts_count) = row[1], row[2]
+        print(f"{row[0]:<32}{matches:>10,}{like_page:>10.1f}ms{fts_page:>10.1f}ms{like_count:>10.1f}ms{fts_count:>10.1f}ms")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
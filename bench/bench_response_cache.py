@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Compare the per-process and shared response cache backends under gunicorn.
+
+For each backend, starts gunicorn with several sync workers against the
+databases in data/, replays the same mix of repeated /api/data, /api/columns
+and /api/health requests from concurrent clients, and reports throughput and
+latency percentiles. With the per-process cache every worker has to warm its
+own copy of each response; with the shared cache the first worker to compute
+a response serves it to all of them.
+
+Usage (from the project root):
+  python bench/bench_response_cache.py --workers 4 --requests 4000 --concurrency 16
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_DIR)
+from data.db_config import DATABASE_FILES, DATASET_TABLES
+
+
+def build_url_mix(distinct_urls, seed=7):
+    """Build a list of distinct request paths: gene panels, pages, columns and health"""
+    rng = random.Random(seed)
+    urls = ['/api/health']
+    for dataset in DATABASE_FILES:
+        urls.append(f'/api/columns/{dataset}')
+    symbols = {}
+    for dataset in ('mrsd_expression', 'mrsd_splice'):
+        conn = sqlite3.connect(os.path.join(PROJECT_DIR, DATABASE_FILES[dataset]))
+        try:
+            symbols[dataset] = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT hgnc_symbol FROM {DATASET_TABLES[dataset]} LIMIT 2000")]
+        except sqlite3.Error:
+            symbols[dataset] = []
+        conn.close()
+    while len(urls) < distinct_urls:
+        dataset = rng.choice(['mrsd_expression', 'mrsd_splice', 'splice_vault'])
+        if dataset == 'splice_vault' or not symbols[dataset]:
+            urls.append(f'/api/data/{dataset}?page={rng.randint(1, 50)}&per_page=10')
+        else:
+            panel = rng.sample(symbols[dataset], min(len(symbols[dataset]), rng.randint(1, 20)))
+            query = '&'.join(f'gene_symbols={symbol}' for symbol in panel)
+            urls.append(f'/api/data/{dataset}?{query}&page=1&per_page=10')
+    return urls
+
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'{base_url}/api/datasets', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def run_load(base_url, urls, total_requests, concurrency, seed=11):
+    """Issue requests drawn from urls (with a skew towards popular ones) and return latencies in ms"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(urls))]
+    plan = rng.choices(urls, weights=weights, k=total_requests)
+
+    def fetch(path):
+        start = time.perf_counter()
+        urllib.request.urlopen(base_url + path, timeout=30).read()
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(fetch, plan))
+    return latencies, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_backend(backend, args, urls):
+    port = args.port
+    env = dict(os.environ, RNASEQ_CACHE_BACKEND=backend)
+    cache_dir = tempfile.mkdtemp()
+    env['RNASEQ_CACHE_PATH'] = os.path.join(cache_dir, 'response_cache.db')
+    # gunicorn.conf.py points at the production checkout, so start from an empty config
+    config_path = os.path.join(cache_dir, 'gunicorn.conf.py')
+    open(config_path, 'w').close()
+    server = subprocess.Popen(
+        ['gunicorn', '-c', config_path, '-w', str(args.workers), '-k', 'sync', '-b', f'127.0.0.1:{port}', '--preload',
+         '--log-level', 'warning', 'app:app'],
+        cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_for_server(base_url)
+        latencies, elapsed = run_load(base_url, urls, args.requests, args.concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        'backend': backend,
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-process vs. shared response cache under gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (default: 4)')
+    parser.add_argument('--requests', type=int, default=4000, help='Total requests per backend')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--distinct', type=int, default=400, help='Distinct URLs in the request mix')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the benchmark server')
+    args = parser.parse_args()
+
+    urls = build_url_mix(args.distinct)
+    print(f"{args.requests:,} requests over {len(urls)} distinct URLs, {args.workers} workers, "
+          f"{args.concurrency} clients\n")
+    print(f"{'backend':<10}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for backend in ('memory', 'shared'):
+        result = bench_backend(backend, args, urls)
+        print(f"{result['backend']:<10}{result['throughput']:>10.1f}{result['p50']:>8.2f}ms"
+              f"{result['p95']:>8.2f}ms{result['p99']:>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
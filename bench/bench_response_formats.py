@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Compare /api/data response formats: row JSON, columnar JSON and Arrow IPC.
+
+Encodes the same synthetic page (shaped like wide mrsd_splice rows) in each
+format the endpoint supports and reports the payload size, raw and gzipped,
+and the server-side encoding time per page.
+
+Usage:
+  python bench/bench_response_formats.py --rows 1000 --columns 40
+"""
+
+import os
+import sys
+import gzip
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from flask import Flask
+from bench_serialization import make_page
+from serialization import (
+    SafeJSONProvider,
+    arrow_available,
+    encode_arrow_stream,
+    rows_to_columns,
+    serialize_columns,
+    serialize_rows
+)
+
+
+def encode_rows(provider, page, names, types):
+    return provider.dumps({'data': serialize_rows(page, names, types)}).encode('utf-8')
+
+
+def encode_columnar(provider, page, names, types):
+    schema, columns = serialize_columns(rows_to_columns(page, len(names)), names, types)
+    return provider.dumps({'format': 'columnar', 'schema': schema, 'columns': columns}).encode('utf-8')
+
+
+def encode_arrow(page, names, types):
+    return encode_arrow_stream(rows_to_columns(page, len(names)), names, types, {'total': len(page)})
+
+
+def ms_per_page(func, seconds):
+    iterations = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        iterations += 1
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/data response formats')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows per page (default: 1000)')
+    parser.add_argument('--columns', type=int, default=40, help='Columns per row (default: 40)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Time per measurement')
+    parser.add_argument('--special-rate', type=float, default=0.001,
+                        help='Fraction of values that are NULL, NaN or infinite (default: 0.001)')
+    args = parser.parse_args()
+
+    provider = SafeJSONProvider(Flask(__name__))
+    page, names, types = make_page(args.rows, args.columns, args.special_rate)
+
+    cases = [
+        ('json', lambda: encode_rows(provider, page, names, types)),
+        ('columnar', lambda: encode_columnar(provider, page, names, types)),
+    ]
+    if arrow_available():
+        cases.append(('arrow', lambda: encode_arrow(page, names, types)))
+    else:
+        print("pyarrow is not installed; skipping the arrow format\n")
+
+    print(f"{args.rows} rows x {args.columns} columns per page, {args.special_rate:.1%} special values\n")
+    print(f"{'format':<12}{'bytes':>12}{'gzipped':>12}{'encode':>12}")
+    for label, func in cases:
+        body = func()
+        print(f"{label:<12}{len(body):>12,}{len(gzip.compress(body)):>12,}{ms_per_page(func, args.seconds):>10.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
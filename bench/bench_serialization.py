@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for /api/data row serialization.
+
+Compares the original per-value sanitizing loop plus Flask's default JSON
+provider against column-wise serialize_rows plus SafeJSONProvider, on
+synthetic pages shaped like wide mrsd_splice rows, and reports rows/second.
+
+Usage:
+  python bench/bench_serialization.py --rows 100 --columns 40
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from serialization import SafeJSONProvider, serialize_rows
+
+
+def make_page(rows, columns, special_rate, seed=3):
+    """Build row tuples with text, integer and real columns, including NULLs and non-finite floats"""
+    rng = random.Random(seed)
+    names = [f"col_{i}" for i in range(columns)]
+    types = {name: ('TEXT', 'INTEGER', 'REAL')[i % 3] for i, name in enumerate(names)}
+    specials = [None, float('inf'), float('-inf'), float('nan')]
+    page = []
+    for _ in range(rows):
+        row = []
+        for name in names:
+            if rng.random() < special_rate:
+                row.append(rng.choice(specials) if types[name] == 'REAL' else None)
+            elif types[name] == 'TEXT':
+                row.append(f"GENE{rng.randint(1, 20000)}")
+            elif types[name] == 'INTEGER':
+                row.append(rng.randint(0, 1000))
+            else:
+                row.append(rng.random() * 100)
+        page.append(tuple(row))
+    return page, names, types
+
+
+def legacy_serialize(page, names):
+    """The original query_data loop: dict per row, then isinstance/isinf/isnan per value"""
+    data = []
+    for row in page:
+        row_dict = dict(zip(names, row))
+        for key, value in row_dict.items():
+            if isinstance(value, bytes):
+                row_dict[key] = value.decode('utf-8', errors='replace')
+            elif isinstance(value, float):
+                if math.isinf(value):
+                    row_dict[key] = "Infinity" if value > 0 else "-Infinity"
+                elif math.isnan(value):
+                    row_dict[key] = "NaN"
+                else:
+                    row_dict[key] = value
+            elif value is None:
+                row_dict[key] = ""
+        data.append(row_dict)
+    has_special_values = any(
+        isinstance(v, str) and v in ("Infinity", "-Infinity", "NaN")
+        for item in data[:5]
+        for k, v in item.items()
+    )
+    return data, has_special_values
+
+
+def rows_per_second(func, rows, seconds):
+    iterations = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        iterations += 1
+    return iterations * rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark row serialization for /api/data')
+    parser.add_argument('--rows', type=int, default=100, help='Rows per page (default: 100)')
+    parser.add_argument('--columns', type=int, default=40, help='Columns per row (default: 40)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Time per measurement')
+    parser.add_argument('--special-rate', type=float, default=0.001,
+                        help='Fraction of values that are NULL, NaN or infinite (default: 0.001)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    safe_provider = SafeJSONProvider(app)
+    page, names, types = make_page(args.rows, args.columns, args.special_rate)
+
+    legacy_json = default_provider.dumps({'data': legacy_serialize(page, names)[0]})
+    new_json = safe_provider.dumps({'data': serialize_rows(page, names, types)})
+    assert legacy_json == new_json, "serialized output differs"
+
+    cases = [
+        ('legacy: sanitize loop', lambda: legacy_serialize(page, names)),
+        ('new: serialize_rows', lambda: serialize_rows(page, names, types)),
+        ('legacy: loop + JSON', lambda: default_provider.dumps({'data': legacy_serialize(page, names)[0]})),
+        ('new: columns + JSON', lambda: safe_provider.dumps({'data': serialize_rows(page, names, types)})),
+    ]
+    print(f"{args.rows} rows x {args.columns} columns per page, {args.special_rate:.1%} special values\n")
+    for label, func in cases:
+        print(f"{label:<26}{rows_per_second(func, args.rows, args.seconds):>14,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
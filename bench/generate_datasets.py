@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Generate synthetic mrsd_splice, splice_vault and mrsd_expression databases.
+
+Each table has the identifier column the app's sample data is keyed on
+(hgnc_symbol or tx_id) plus the columns the API filters and searches on, and
+a number of numeric filler columns to give rows a realistic width. After
+loading, the same indexes, full-text and region indexes, row counts, facet
+and summary tables as the ingest script are built, so the databases can be
+served as they are by pointing the app at the output directory with
+RNASEQ_DATA_DIR.
+
+Data is generated deterministically from --seed and written in batches, so
+runs at 1e8 rows need little memory (but a lot of disk and time).
+
+Usage (from the project root):
+  python bench/generate_datasets.py --rows 1e6 --output bench/data
+  RNASEQ_DATA_DIR=bench/data gunicorn app:app
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+from tsv_to_sql_all import (build_fts_index, build_indexes, build_region_index, write_facets, write_row_counts,
+                            write_summary)
+from db_config import DATASET_TABLES
+
+SAMPLE_TYPES = ['blood', 'fibroblast', 'lcl', 'muscle', 'iPSC']
+TARGET_COUNTS = [10, 20, 50, 100, 200]
+EVENTS = ['exon_skipping', 'cryptic_donor', 'cryptic_acceptor', 'intron_retention']
+CHROMOSOMES = [f"chr{i}" for i in range(1, 23)] + ['chrX', 'chrY']
+
+
+def gene_symbols(count):
+    return [f"GENE{i}" for i in range(count)]
+
+
+def filler_columns(count):
+    return [(f"metric_{i}", 'REAL') for i in range(count)]
+
+
+def dataset_schema(dataset, extra_columns):
+    """Return the (name, type) columns of a synthetic table"""
+    if dataset == 'splice_vault':
+        columns = [('tx_id', 'TEXT'), ('canonical', 'INTEGER'), ('gene_name', 'TEXT'), ('event', 'TEXT'),
+                   ('chrom', 'TEXT'), ('start', 'INTEGER'), ('end', 'INTEGER')]
+    elif dataset == 'mrsd_splice':
+        columns = [('hgnc_symbol', 'TEXT'), ('sample_type', 'TEXT'), ('target_count', 'INTEGER'),
+                   ('percentage_junction_covered', 'REAL'), ('chrom', 'TEXT'), ('start', 'INTEGER'),
+                   ('end', 'INTEGER')]
+    else:
+        columns = [('hgnc_symbol', 'TEXT'), ('sample_type', 'TEXT'), ('target_count', 'INTEGER'),
+                   ('tpm', 'REAL'), ('mrsd', 'REAL')]
+    return columns + filler_columns(extra_columns)
+
+
+def make_row(dataset, index, rng, genes, extra_columns):
+    """Build one row tuple matching dataset_schema"""
+    if dataset == 'splice_vault':
+        start = rng.randint(1, 250000000)
+        row = [f"ENST{index:011d}", rng.randint(0, 1), rng.choice(genes), rng.choice(EVENTS),
+               rng.choice(CHROMOSOMES), start, start + rng.randint(10, 5000)]
+    elif dataset == 'mrsd_splice':
+        start = rng.randint(1, 250000000)
+        row = [rng.choice(genes), rng.choice(SAMPLE_TYPES), rng.choice(TARGET_COUNTS),
+               round(rng.random() * 100, 1), rng.choice(CHROMOSOMES), start, start + rng.randint(10, 5000)]
+    else:
+        # A small share of non-finite values exercises the serialization slow path
+        mrsd = float('inf') if rng.random() < 0.001 else rng.random()
+        row = [rng.choice(genes), rng.choice(SAMPLE_TYPES), rng.choice(TARGET_COUNTS), rng.random() * 500, mrsd]
+    row.extend(rng.random() for _ in range(extra_columns))
+    return tuple(row)
+
+
+def generate_dataset(dataset, db_path, rows, genes, extra_columns, seed, batch_size=100000):
+    """Write a synthetic table of the given size to db_path, replacing any existing file"""
+    table_name = DATASET_TABLES[dataset]
+    columns = dataset_schema(dataset, extra_columns)
+    build_path = db_path + '.tmp'
+    if os.path.exists(build_path):
+        os.remove(build_path)
+
+    rng = random.Random(f"{seed}:{dataset}")
+    conn = sqlite3.connect(build_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        column_defs = ', '.join(f'"{name}" {col_type}' for name, col_type in columns)
+        conn.execute(f"CREATE TABLE {table_name} ({column_defs})")
+        insert_sql = f"INSERT INTO {table_name} VALUES ({', '.join('?' for _ in columns)})"
+        start_time = time.time()
+        for start in range(0, rows, batch_size):
+            batch = [make_row(dataset, i, rng, genes, extra_columns)
+                     for i in range(start, min(start + batch_size, rows))]
+            conn.executemany(insert_sql, batch)
+            conn.commit()
+            done = start + len(batch)
+            print(f"{dataset}: {done:,}/{rows:,} rows ({done / max(time.time() - start_time, 1e-9):,.0f} rows/s)",
+                  end='\r', flush=True)
+        print()
+    finally:
+        conn.close()
+
+    build_indexes(build_path, table_name, dataset)
+    build_fts_index(build_path, table_name, dataset)
+    build_region_index(build_path, table_name, dataset)
+    write_row_counts(build_path, table_name, dataset)
+    write_facets(build_path, table_name, dataset)
+    write_summary(build_path, table_name, dataset)
+    os.replace(build_path, db_path)
+    print(f"Wrote {db_path} ({os.path.getsize(db_path) / 1e6:,.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic databases for benchmarking the API')
+    parser.add_argument('--rows', type=float, default=1e5, help='Rows per dataset, e.g. 1e5 to 1e8 (default: 1e5)')
+    parser.add_argument('--output', default=os.path.join('bench', 'data'),
+                        help='Directory to write the databases to (default: bench/data)')
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASET_TABLES), default=list(DATASET_TABLES),
+                        help='Datasets to generate (default: all)')
+    parser.add_argument('--genes', type=int, default=20000, help='Distinct gene symbols (default: 20000)')
+    parser.add_argument('--extra-columns', type=int, default=8,
+                        help='Numeric filler columns per row (default: 8)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    args = parser.parse_args()
+
+    rows = int(args.rows)
+    os.makedirs(args.output, exist_ok=True)
+    genes = gene_symbols(args.genes)
+    for dataset in args.datasets:
+        start_time = time.time()
+        generate_dataset(dataset, os.path.join(args.output, f"{dataset}.db"), rows, genes, args.extra_columns,
+                         args.seed)
+        print(f"Generated {dataset} in {time.time() - start_time:.1f} seconds\n")
+
+
+if __name__ == '__main__':
+    main()
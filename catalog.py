@@ -0,0 +1,224 @@
+"""
+Dataset catalog: per-dataset metadata kept in memory.
+
+Columns, declared types, row counts and the database file version are read
+once when the app starts. A background thread in each worker then checks the
+database files every few seconds and reloads the entry of any file that was
+replaced (e.g. by a new ingest), so requests for metadata never touch SQLite.
+
+Each entry also carries the table schema: per column its declared type, type
+affinity, nullability and the indexes it appears in, plus the columns of the
+full-text index and of the summary table built at ingest, and whether the
+R*Tree region index exists. The app validates columns, picks serializers and
+plans searches from it; ``current`` re-checks the file version with a stat so
+a swapped database is picked up before the next refresh.
+
+Row counts come from the counts precomputed at ingest; databases built
+before those existed are counted once when their entry is loaded.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+from data.db_config import SUMMARY_TABLE, get_fts_table, get_region_table
+from serialization import column_affinity
+
+logger = logging.getLogger(__name__)
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+
+
+def read_indexes(conn, table_name):
+    """Return {index name: [column, ...]} for the indexes of a table, columns in index order"""
+    indexes = {}
+    for row in conn.execute(f"PRAGMA index_list({table_name})"):
+        index_name = row[1]
+        columns = [info[2] for info in sorted(conn.execute(f"PRAGMA index_info('{index_name}')"))]
+        # Expression index entries have no column name
+        indexes[index_name] = [col for col in columns if col is not None]
+    return indexes
+
+
+def read_fts_columns(conn, table_name):
+    """Return the columns of a table's full-text index, or [] if it has none"""
+    fts_table = get_fts_table(table_name)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)).fetchone()
+    if not exists:
+        return []
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({fts_table})")]
+
+
+def build_schema(table_info, indexes):
+    """Describe each column: declared type, affinity, nullability and the indexes it is in"""
+    schema = []
+    for cid, name, declared_type, notnull, default, pk in table_info:
+        schema.append({
+            'name': name,
+            'type': declared_type,
+            'affinity': column_affinity(declared_type),
+            'nullable': not notnull and not pk,
+            'primary_key': bool(pk),
+            # Only an index led by the column can serve a lookup or sort on it alone
+            'indexed': any(columns and columns[0] == name for columns in indexes.values()),
+            'indexes': [index_name for index_name, columns in indexes.items() if name in columns]
+        })
+    return schema
+
+
+class DatasetCatalog:
+    """Metadata of each dataset, keyed by database version and refreshed in the background
+
+    connect(dataset) returns a context manager yielding a SQLite connection,
+    version_of(dataset) an identifier that changes whenever the database file
+    does, and precomputed_count(conn, dataset) the unfiltered row count stored
+    at ingest or None.
+    """
+
+    def __init__(self, database_files, dataset_tables, connect, version_of, precomputed_count,
+                 refresh_interval=30.0):
+        self.database_files = dict(database_files)
+        self.dataset_tables = dict(dataset_tables)
+        self.connect = connect
+        self.version_of = version_of
+        self.precomputed_count = precomputed_count
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Serializes reloads so a swapped file is only read once
+        self._load_lock = threading.Lock()
+        self._refresher_pid = None
+        self._stats = {'loads': 0, 'errors': 0, 'checks': 0}
+        self._checked_at = None
+
+    def _load(self, dataset_name, version):
+        table_name = self.dataset_tables[dataset_name]
+        db_path = self.database_files[dataset_name]
+        start = time.perf_counter()
+        with self.connect(dataset_name) as conn:
+            table_info = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+            indexes = read_indexes(conn, table_name)
+            fts_columns = read_fts_columns(conn, table_name)
+            # Empty for databases without a summary table
+            summary_info = conn.execute(f"PRAGMA table_info({SUMMARY_TABLE})").fetchall()
+            region_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (get_region_table(table_name),)
+            ).fetchone() is not None
+            row_count = self.precomputed_count(conn, dataset_name)
+            if row_count is None:
+                row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        st = os.stat(db_path)
+        logger.info(f"Loaded catalog entry for {dataset_name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return {
+            'available': True,
+            'table': table_name,
+            'columns': [row[1] for row in table_info],
+            'column_types': {row[1]: row[2] for row in table_info},
+            'column_affinities': {row[1]: column_affinity(row[2]) for row in table_info},
+            'schema': build_schema(table_info, indexes),
+            'indexes': indexes,
+            'fts_columns': fts_columns,
+            'summary_columns': [row[1] for row in summary_info],
+            'summary_affinities': {row[1]: column_affinity(row[2]) for row in summary_info},
+            'region_index': region_index,
+            'row_count': row_count,
+            'file_size': st.st_size,
+            'modified': _isoformat(st.st_mtime),
+            'loaded_at': _isoformat(time.time()),
+            'version': list(version)
+        }
+
+    def refresh(self, dataset_names=None):
+        """Reload the entries whose database version changed; return the names reloaded"""
+        reloaded = []
+        for dataset_name in dataset_names or list(self.database_files):
+            with self._load_lock:
+                if self._reload_if_changed(dataset_name):
+                    reloaded.append(dataset_name)
+        with self._lock:
+            self._stats['checks'] += 1
+            self._checked_at = time.time()
+        return reloaded
+
+    def _reload_if_changed(self, dataset_name):
+        """Reload one entry if its database version changed; True if it was reloaded"""
+        try:
+            version = self.version_of(dataset_name)
+        except OSError as e:
+            with self._lock:
+                self._entries[dataset_name] = {'available': False, 'error': str(e)}
+            return False
+        with self._lock:
+            entry = self._entries.get(dataset_name)
+        if entry and entry.get('version') == list(version):
+            return False
+        try:
+            entry = self._load(dataset_name, version)
+            with self._lock:
+                self._stats['loads'] += 1
+        except Exception as e:
+            logger.error(f"Failed to load catalog entry for {dataset_name}: {e}")
+            # Keep the version so a broken file isn't reloaded on every lookup
+            entry = {'available': False, 'error': str(e), 'version': list(version)}
+            with self._lock:
+                self._stats['errors'] += 1
+        with self._lock:
+            self._entries[dataset_name] = entry
+        return entry.get('available', False)
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Catalog refresh failed: {e}")
+
+    def ensure_refresher(self):
+        """Start the background refresh thread in this process, once per fork"""
+        if not self.refresh_interval or self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+        threading.Thread(target=self._refresh_loop, name='catalog-refresh', daemon=True).start()
+
+    def get(self, dataset_name):
+        """Return the catalog entry of a dataset, or None if it was never loaded"""
+        self.ensure_refresher()
+        with self._lock:
+            return self._entries.get(dataset_name)
+
+    def current(self, dataset_name):
+        """Return the entry of a dataset for its database file as it is now
+
+        Costs a stat of the file when nothing changed; a replaced file is
+        reloaded before returning. Entries are shared and must not be modified.
+        """
+        try:
+            version = list(self.version_of(dataset_name))
+        except OSError:
+            version = None
+        with self._lock:
+            entry = self._entries.get(dataset_name)
+        if entry is None or entry.get('version') != version:
+            self.refresh([dataset_name])
+            with self._lock:
+                entry = self._entries.get(dataset_name)
+        return entry
+
+    def snapshot(self):
+        """Return every entry plus when the files were last checked"""
+        self.ensure_refresher()
+        with self._lock:
+            return {
+                'datasets': dict(self._entries),
+                'checked_at': _isoformat(self._checked_at) if self._checked_at else None,
+                'refresh_interval': self.refresh_interval,
+                'stats': dict(self._stats)
+            }
@@ -1,10 +1,27 @@
 # Database configuration
+import os
+import tempfile
+
+
+def env_seconds(name, default):
+    """Read a duration in seconds from the environment; '', 'none' or 'off' give None"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.strip().lower() in ('', 'none', 'off'):
+        return None
+    return float(value)
+
+
+# Directory holding the SQLite database files (override to serve another set,
+# e.g. synthetic databases generated for benchmarking)
+DATA_DIR = os.environ.get('RNASEQ_DATA_DIR', 'data')
 
 # Path to SQLite database files
 DATABASE_FILES = {
-    'mrsd_splice': 'data/mrsd_splice.db',
-    'splice_vault': 'data/splice_vault.db',
-    'mrsd_expression': 'data/mrsd_expression.db'
+    'mrsd_splice': os.path.join(DATA_DIR, 'mrsd_splice.db'),
+    'splice_vault': os.path.join(DATA_DIR, 'splice_vault.db'),
+    'mrsd_expression': os.path.join(DATA_DIR, 'mrsd_expression.db')
 }
 
 # Map dataset names to their database tables
@@ -14,6 +31,109 @@ DATASET_TABLES = {
     'mrsd_expression': 'mrsd_expression'
 }
 
+# Indexes built at ingest, as index name -> columns. Filter columns come first;
+# trailing columns make the index covering for queries that only read them.
+DATASET_INDEXES = {
+    'mrsd_splice': {
+        'idx_mrsd_splice_symbol': ['hgnc_symbol', 'sample_type', 'target_count'],
+        'idx_mrsd_splice_sample_type': ['sample_type', 'target_count'],
+        'idx_mrsd_splice_target_count': ['target_count'],
+        'idx_mrsd_splice_pct_covered': ['percentage_junction_covered']
+    },
+    'splice_vault': {
+        'idx_splice_vault_canonical_tx': ['canonical', 'tx_id']
+    },
+    'mrsd_expression': {
+        'idx_mrsd_expression_symbol': ['hgnc_symbol', 'sample_type', 'target_count'],
+        'idx_mrsd_expression_sample_type': ['sample_type', 'target_count'],
+        'idx_mrsd_expression_target_count': ['target_count']
+    }
+}
+
+# Columns the API filters on. 'param' is the query parameter of a plain
+# filter (default: the column name) and 'aliases' other names accepted for
+# it; 'type' converts values ('text', 'int' or 'float'); 'ops' lists the
+# operators allowed, the first one applying to the plain parameter:
+#   eq      ?param=v                        column = ?
+#   in      ?param=a&param=b or ?param=a,b  column IN (...), = for one value
+#   range   ?column_min=lo&column_max=hi    column >= ? AND column <= ?
+#   prefix  ?column_prefix=AB               column >= 'AB' AND column < 'AC'
+#   null    ?column_null=true|false         column IS NULL / IS NOT NULL
+#   panel   ?panel=<id>                     column IN the symbols of a stored gene panel
+# Each column should lead an index in DATASET_INDEXES so its filters can seek
+# instead of scanning; tsv_to_sql_all.py --check reports those that don't.
+DATASET_FILTERS = {
+    'mrsd_splice': {
+        'hgnc_symbol': {'param': 'gene_symbols', 'aliases': ['gene_symbols[]'],
+                        'ops': ['in', 'prefix', 'panel']},
+        'target_count': {'type': 'int', 'ops': ['in', 'range']},
+        'sample_type': {'ops': ['in']},
+        'percentage_junction_covered': {'type': 'float', 'ops': ['eq', 'range', 'null']}
+    },
+    'splice_vault': {
+        'canonical': {'type': 'int', 'ops': ['eq']},
+        'tx_id': {'ops': ['in', 'prefix']}
+    },
+    'mrsd_expression': {
+        'hgnc_symbol': {'param': 'gene_symbols', 'aliases': ['gene_symbols[]'],
+                        'ops': ['in', 'prefix', 'panel']},
+        'target_count': {'type': 'int', 'ops': ['in', 'range']},
+        'sample_type': {'ops': ['in']}
+    }
+}
+
+# Filters the API always applies to a dataset, as column -> value; request
+# parameters can't override them
+DEFAULT_FILTERS = {
+    'splice_vault': {'canonical': 1}
+}
+
+# Compiled filter clauses cached per combination of operators and IN list sizes
+FILTER_PLAN_CACHE_SIZE = 1024
+
+# IN lists longer than this are bound as a single JSON array parameter and
+# read with json_each, so they stay under SQLite's variable limit and every
+# long list shares one statement
+FILTER_IN_JSON_MIN_VALUES = 50
+
+# Gene panels stored by POST /api/panels, keyed by a hash of their symbols
+# and shared by all workers
+PANEL_STORE_PATH = os.environ.get('RNASEQ_PANEL_PATH', os.path.join(DATA_DIR, 'gene_panels.db'))
+
+# Maximum symbols per gene panel
+PANEL_MAX_GENES = 50000
+
+# Panels kept decoded in memory per worker
+PANEL_CACHE_ENTRIES = 256
+
+# Genomic interval columns queried with ?region=chrom:start-end. An R*Tree
+# over them is built at ingest; a row matches a region it overlaps
+# (start <= region end and end >= region start), in the data's own coordinates
+DATASET_REGIONS = {
+    'mrsd_splice': {'chrom': 'chrom', 'start': 'start', 'end': 'end'},
+    'splice_vault': {'chrom': 'chrom', 'start': 'start', 'end': 'end'}
+}
+
+# Table written at ingest numbering the distinct chromosomes, which the
+# R*Tree stores as integers
+REGION_CHROMS_TABLE = '_region_chroms'
+
+# Text columns indexed for substring search by an FTS5 trigram table built at
+# ingest; '*' indexes every TEXT column of the table
+FTS_COLUMNS = {
+    'splice_vault': '*'
+}
+
+# Substring searches shorter than this can't use a trigram index and use LIKE
+FTS_MIN_TERM_LENGTH = 3
+
+# Name of the full-text shadow table for a data table
+def get_fts_table(table_name):
+    return f"{table_name}_fts"
+
+def get_region_table(table_name):
+    return f"{table_name}_region"
+
 # SQLite connection string format
 def get_db_uri(dataset):
     return f"sqlite:///{DATABASE_FILES[dataset]}"
@@ -23,3 +143,159 @@ DEFAULT_CHUNK_SIZE = 1000
 
 # Timeout settings for database operations (in seconds)
 DATABASE_TIMEOUT = 30
+
+# Per-worker connection pool settings
+# Maximum number of idle connections kept per dataset
+POOL_MAX_IDLE = 4
+
+# Idle connections older than this (in seconds) are health-checked before reuse
+POOL_HEALTH_CHECK_INTERVAL = 60
+
+# Seconds of database work allowed per API request before its query is
+# interrupted; keep it below gunicorn's worker timeout. 0 or None (RNASEQ_REQUEST_TIMEOUT=off)
+# disables it.
+REQUEST_TIMEOUT = env_seconds('RNASEQ_REQUEST_TIMEOUT', 20)
+
+# Exports stream for longer, so they get their own limit; 0 or None
+# (RNASEQ_EXPORT_TIMEOUT=off) disables it
+EXPORT_TIMEOUT = env_seconds('RNASEQ_EXPORT_TIMEOUT', 300)
+
+# Queries slower than this many seconds are logged with their query plan;
+# None (RNASEQ_SLOW_QUERY_SECONDS=off) disables the log
+SLOW_QUERY_THRESHOLD = env_seconds('RNASEQ_SLOW_QUERY_SECONDS', 0.5)
+
+# SQLite virtual machine instructions between deadline checks
+QUERY_PROGRESS_INTERVAL = 10000
+
+# Seconds between checks of the database files for a new version to reload
+# into the dataset catalog served by /api/catalog; 0 disables the refresh
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('RNASEQ_CATALOG_REFRESH_SECONDS', 30))
+
+# PRAGMAs applied to every pooled read-only connection
+SQLITE_PRAGMAS = {
+    'query_only': 'ON',
+    'mmap_size': 268435456,   # 256 MB memory-mapped I/O
+    'cache_size': -65536,     # 64 MB page cache (negative = KiB)
+    'temp_store': 'MEMORY'
+}
+
+# Table written at ingest holding precomputed row counts
+ROW_COUNTS_TABLE = '_row_counts'
+
+# Filters whose row counts are precomputed at ingest, as (where clause, params).
+# The empty clause is the unfiltered table count; datasets not listed only get that.
+PRECOMPUTED_COUNTS = {
+    'mrsd_splice': [('', [])],
+    'splice_vault': [('', []), ('canonical = ?', [1])],
+    'mrsd_expression': [('', [])]
+}
+
+# Ingest settings
+# Table written at ingest recording how far a resumable load has progressed
+INGEST_PROGRESS_TABLE = '_ingest_progress'
+
+# Rows inserted between ingest checkpoints; 0 loads in a single transaction
+INGEST_CHECKPOINT_ROWS = 1000000
+
+# A rebuilt table with fewer rows than this fraction of the live table is not
+# swapped in without --force; None disables the check
+INGEST_MIN_ROW_RATIO = 0.5
+
+# Column types ('TEXT', 'INTEGER' or 'REAL') overriding the ones inferred from
+# the first chunk of a TSV file, for columns whose first values are unrepresentative
+INGEST_COLUMN_TYPES = {}
+
+# Facet tables written at ingest: distinct values with row counts, overall
+# and per value of the dataset's gene column
+FACETS_TABLE = '_facets'
+FACETS_BY_GROUP_TABLE = '_facets_by_group'
+
+# Columns offered as filter facets by /api/facets
+FACET_COLUMNS = {
+    'mrsd_splice': ['sample_type', 'target_count'],
+    'mrsd_expression': ['sample_type', 'target_count']
+}
+
+# Column whose filter the facet counts can be conditioned on (the gene filter)
+FACET_GROUP_COLUMNS = {
+    'mrsd_splice': 'hgnc_symbol',
+    'mrsd_expression': 'hgnc_symbol'
+}
+
+# Summary table written at ingest and served by /api/summary: one row per
+# combination of the 'group_by' columns, with the row count and the min,
+# median and max of each numeric column ('columns', or every INTEGER and REAL
+# column not grouped on when None)
+SUMMARY_TABLE = '_summary'
+DATASET_SUMMARIES = {
+    'mrsd_expression': {'group_by': ['hgnc_symbol', 'sample_type'], 'columns': None}
+}
+
+# Maximum summary rows per /api/summary page
+SUMMARY_MAX_PER_PAGE = 1000
+
+# Maximum number of cached COUNT(*) results per worker
+COUNT_CACHE_MAX_ENTRIES = 10000
+
+# With count=estimate, filtered counts stop scanning after this many rows
+COUNT_ESTIMATE_CAP = 10000
+
+# Columns allowed in a sort=col:asc,col2:desc parameter
+SORT_MAX_COLUMNS = 3
+
+# Sorts no index can serve are run once per filter as a top-k query for this
+# many rowids, and pages within them are read by rowid; deeper pages fall back
+# to a LIMIT/OFFSET sort, which SQLite also bounds to offset + limit rows
+SORT_TOPK_ROWS = 10000
+
+# Maximum number of cached top-k rowid lists per worker
+SORT_CACHE_MAX_ENTRIES = 64
+
+# Export settings
+# Rows fetched from the database cursor per batch while streaming an export
+EXPORT_BATCH_SIZE = 5000
+
+# Maximum rows per export for external clients
+EXPORT_ROW_LIMIT = 100000
+
+# Clients in these networks may request unlimited exports (limit=0)
+EXPORT_INTERNAL_NETWORKS = ['127.0.0.0/8', '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '::1/128']
+
+# Columns offered by /api/suggest prefix autocomplete
+SUGGEST_COLUMNS = {
+    'mrsd_splice': ['hgnc_symbol'],
+    'splice_vault': ['tx_id'],
+    'mrsd_expression': ['hgnc_symbol']
+}
+
+# Maximum suggestions returned per request
+SUGGEST_MAX_LIMIT = 100
+
+# Maximum sub-queries per /api/batch request
+BATCH_MAX_QUERIES = 20
+
+# Threads per worker running batch sub-queries concurrently
+BATCH_MAX_WORKERS = 4
+
+# Response cache for /api/data, /api/columns, /api/facets, /api/summary and /api/batch sub-queries.
+# 'memory' keeps a separate LRU in each worker; 'shared' uses one SQLite
+# key-value file shared by all workers, on tmpfs when /dev/shm exists and in
+# the system temp directory otherwise.
+RESPONSE_CACHE_BACKEND = os.environ.get('RNASEQ_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_PATH = os.environ.get(
+    'RNASEQ_CACHE_PATH',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'rnaseq_response_cache.db')
+)
+
+# Eviction policy for the shared backend: 'lru' or 'ttl'
+RESPONSE_CACHE_EVICTION = os.environ.get('RNASEQ_CACHE_EVICTION', 'lru')
+
+# Seconds before a shared entry expires; unset or 0 keeps entries until evicted.
+# Required for 'ttl' eviction, which otherwise falls back to 'lru'.
+RESPONSE_CACHE_TTL = float(os.environ.get('RNASEQ_CACHE_TTL') or 0) or None
+
+# Maximum total size of cached response bodies
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Responses larger than this are never cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = 1024 * 1024
@@ -6,116 +6,887 @@ This script will scan the data directory for TSV files and convert them to SQLit
 It handles large files efficiently by processing them in chunks to minimize memory usage.
 
 Usage:
-  python tsv_to_sql_all.py
+  python tsv_to_sql_all.py                 # convert TSV files, then build indexes
+  python tsv_to_sql_all.py --workers 8     # parse chunks in 8 processes
+  python tsv_to_sql_all.py --resume        # continue interrupted loads from their last checkpoint
+  python tsv_to_sql_all.py --indexes-only  # rebuild indexes, row counts, full-text, region, facet and summary tables
+  python tsv_to_sql_all.py --check         # report API queries that need a full table scan
 """
 
+import io
 import os
 import sys
+import gzip
+import json
 import time
-import gc
+import queue
+import hashlib
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, islice
+from pathlib import Path
 import pandas as pd
-from sqlalchemy import create_engine
-from db_config import DATABASE_FILES, DATASET_TABLES
+from db_config import (
+    DATABASE_FILES,
+    DATASET_TABLES,
+    DATASET_INDEXES,
+    DATASET_FILTERS,
+    DEFAULT_FILTERS,
+    FTS_COLUMNS,
+    DATASET_REGIONS,
+    REGION_CHROMS_TABLE,
+    ROW_COUNTS_TABLE,
+    PRECOMPUTED_COUNTS,
+    FACETS_TABLE,
+    FACETS_BY_GROUP_TABLE,
+    FACET_COLUMNS,
+    FACET_GROUP_COLUMNS,
+    SUMMARY_TABLE,
+    DATASET_SUMMARIES,
+    INGEST_PROGRESS_TABLE,
+    INGEST_CHECKPOINT_ROWS,
+    INGEST_COLUMN_TYPES,
+    INGEST_MIN_ROW_RATIO,
+    get_fts_table,
+    get_region_table
+)
+
+# Representative SQL for each filter operator in DATASET_FILTERS; a plain
+# parameter with a single value compiles to = even for IN filters
+FILTER_SHAPE_SQL = {
+    'eq': '{col} = ?',
+    'in': '{col} = ?',
+    'range': '{col} >= ? AND {col} <= ?',
+    'prefix': '{col} >= ? AND {col} < ?',
+    'null': '{col} IS NULL'
+}
+
+# pandas dtype used to parse each SQLite column type
+PANDAS_DTYPES = {
+    'INTEGER': 'Int64',
+    'REAL': 'float64',
+    'TEXT': 'str'
+}
+
+def get_columns(conn, table_name):
+    """Return the column names of a table"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+def build_indexes(db_path, table_name, dataset_name):
+    """
+    Create the indexes declared in DATASET_INDEXES and refresh planner statistics.
+
+    Indexes that reference columns missing from the table are skipped with a warning.
+
+    Args:
+        db_path: Path to the SQLite database file
+        table_name: Name of the data table
+        dataset_name: Dataset name used to look up the index specs
+    """
+    indexes = DATASET_INDEXES.get(dataset_name, {})
+
+    conn = sqlite3.connect(db_path)
+    try:
+        columns = set(get_columns(conn, table_name))
+        for index_name, index_columns in indexes.items():
+            missing = [col for col in index_columns if col not in columns]
+            if missing:
+                print(f"Skipping index {index_name}: missing columns {', '.join(missing)}")
+                continue
+            start_time = time.time()
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(index_columns)})")
+            print(f"Built index {index_name} ({', '.join(index_columns)}) in {time.time() - start_time:.1f} seconds")
+
+        # Gather statistics so the query planner can choose between indexes
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
 
-def convert_tsv_to_sqlite(tsv_path, db_path, table_name, chunk_size=100000):
+def build_fts_index(db_path, table_name, dataset_name):
     """
-    Convert a TSV file to a SQLite database, processing in chunks to minimize memory usage.
+    Build an FTS5 trigram shadow table over the searchable text columns so the
+    API can answer substring searches without scanning the data table.
+
+    The shadow table uses the data table as external content, so it only stores
+    the trigram index, not a second copy of the text.
 
     Args:
-        tsv_path: Path to the TSV file
-        db_path: Path to the SQLite database file to create
-        table_name: Name of the table to create in the database
-        chunk_size: Number of rows to process at once
+        db_path: Path to the SQLite database file
+        table_name: Name of the data table
+        dataset_name: Dataset name used to look up the searchable columns
+    """
+    fts_columns = FTS_COLUMNS.get(dataset_name)
+    if not fts_columns:
+        return
+
+    fts_table = get_fts_table(table_name)
+    conn = sqlite3.connect(db_path)
+    try:
+        table_info = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+        if fts_columns == '*':
+            fts_columns = [row[1] for row in table_info if row[2].upper() == 'TEXT']
+        else:
+            existing = {row[1] for row in table_info}
+            fts_columns = [col for col in fts_columns if col in existing]
+        if not fts_columns:
+            print(f"No searchable text columns found for {table_name}, skipping full-text index")
+            return
+
+        start_time = time.time()
+        conn.execute(f"DROP TABLE IF EXISTS {fts_table}")
+        conn.execute(
+            f"CREATE VIRTUAL TABLE {fts_table} USING fts5({', '.join(fts_columns)}, "
+            f"content='{table_name}', content_rowid='rowid', tokenize='trigram')"
+        )
+        conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+        conn.commit()
+        print(f"Built full-text index {fts_table} ({', '.join(fts_columns)}) in {time.time() - start_time:.1f} seconds")
+    except sqlite3.OperationalError as e:
+        # SQLite builds without FTS5 or the trigram tokenizer (< 3.34) fall back to LIKE
+        print(f"Could not build full-text index {fts_table}: {e}")
+    finally:
+        conn.close()
+
+def build_region_index(db_path, table_name, dataset_name):
+    """
+    Build an R*Tree over the interval columns in DATASET_REGIONS so the API
+    can answer ?region=chrom:start-end overlap queries without a scan.
+
+    Chromosomes are numbered in REGION_CHROMS_TABLE and stored as a degenerate
+    first dimension, so one tree covers the whole genome. Each entry's id is
+    the rowid of its data row; rows with a NULL chromosome or position are
+    left out.
+
+    Args:
+        db_path: Path to the SQLite database file
+        table_name: Name of the data table
+        dataset_name: Dataset name used to look up the interval columns
+    """
+    spec = DATASET_REGIONS.get(dataset_name)
+    if not spec:
+        return
+
+    region_table = get_region_table(table_name)
+    conn = sqlite3.connect(db_path)
+    try:
+        columns = set(get_columns(conn, table_name))
+        missing = [col for col in (spec['chrom'], spec['start'], spec['end']) if col not in columns]
+        if missing:
+            print(f"Skipping region index for {table_name}: missing columns {', '.join(missing)}")
+            return
+
+        start_time = time.time()
+        chrom, start, end = (quote_identifier(spec[key]) for key in ('chrom', 'start', 'end'))
+        conn.execute(f"DROP TABLE IF EXISTS {region_table}")
+        conn.execute(f"DROP TABLE IF EXISTS {REGION_CHROMS_TABLE}")
+        conn.execute(f"CREATE TABLE {REGION_CHROMS_TABLE} (chrom TEXT PRIMARY KEY, chrom_id INTEGER)")
+        conn.execute(
+            f"INSERT INTO {REGION_CHROMS_TABLE} SELECT chrom, ROW_NUMBER() OVER (ORDER BY chrom) "
+            f"FROM (SELECT DISTINCT {chrom} AS chrom FROM {table_name} WHERE {chrom} IS NOT NULL)"
+        )
+        # 32-bit integer coordinates keep positions exact (float boxes round above 2^24)
+        conn.execute(f"CREATE VIRTUAL TABLE {region_table} USING rtree_i32(id, chrom_lo, chrom_hi, pos_lo, pos_hi)")
+        # Inserting in genome order keeps the tree's nodes compact
+        conn.execute(
+            f"INSERT INTO {region_table} SELECT t.rowid, c.chrom_id, c.chrom_id, MIN(t.{start}, t.{end}), "
+            f"MAX(t.{start}, t.{end}) FROM {table_name} AS t JOIN {REGION_CHROMS_TABLE} AS c ON c.chrom = t.{chrom} "
+            f"WHERE t.{start} IS NOT NULL AND t.{end} IS NOT NULL ORDER BY c.chrom_id, t.{start}"
+        )
+        conn.commit()
+        entries = conn.execute(f"SELECT COUNT(*) FROM {region_table}").fetchone()[0]
+        print(f"Built region index {region_table} ({entries:,} intervals) in {time.time() - start_time:.1f} seconds")
+    except sqlite3.OperationalError as e:
+        # SQLite builds without the R*Tree module fall back to comparing the interval columns
+        print(f"Could not build region index {region_table}: {e}")
+    finally:
+        conn.close()
+
+def api_query_shapes(table_name, dataset_name, columns):
+    """
+    Yield (filter columns, description, sql) for the filter combinations the API can issue.
+
+    Covers the count query, the OFFSET page query and the keyset page query
+    for every combination of the dataset's filter columns.
+    """
+    filters = {col: spec for col, spec in DATASET_FILTERS.get(dataset_name, {}).items() if col in columns}
+    defaults = [col for col in DEFAULT_FILTERS.get(dataset_name, {}) if col in filters]
+    optional = [col for col in filters if col not in defaults]
+
+    for size in range(len(optional) + 1):
+        for combo in combinations(optional, size):
+            filter_columns = defaults + list(combo)
+            # Each filter in the form of its plain parameter (first operator)
+            conditions = [
+                FILTER_SHAPE_SQL[filters[col]['ops'][0]].format(col=col)
+                for col in filter_columns
+            ]
+            where = " WHERE " + " AND ".join(conditions) if conditions else ""
+            keyset_where = " WHERE " + " AND ".join(conditions + ["rowid > ?"])
+            label = ", ".join(filter_columns) or "no filters"
+            yield filter_columns, f"count [{label}]", f"SELECT COUNT(*) FROM {table_name}{where}"
+            yield filter_columns, f"page [{label}]", f"SELECT * FROM {table_name}{where} LIMIT ? OFFSET ?"
+            yield filter_columns, f"keyset page [{label}]", f"SELECT rowid, * FROM {table_name}{keyset_where} ORDER BY rowid LIMIT ?"
+
+def check_query_plans(db_path, table_name, dataset_name):
+    """
+    Run EXPLAIN QUERY PLAN for the API's query shapes and report full table scans.
+
+    Unfiltered queries are expected to scan and are not reported.
+
+    Returns:
+        Number of filtered queries that fall back to a full table scan
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        columns = set(get_columns(conn, table_name))
+        full_scans = 0
+        for filter_columns, description, sql in api_query_shapes(table_name, dataset_name, columns):
+            if not filter_columns:
+                continue
+            params = [None] * sql.count("?")
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            if any(step == f"SCAN {table_name}" for step in plan):
+                full_scans += 1
+                print(f"FULL SCAN {dataset_name} {description}: {sql}")
+                for step in plan:
+                    print(f"    {step}")
+        return full_scans
+    finally:
+        conn.close()
+
+def write_row_counts(db_path, table_name, dataset_name):
+    """
+    Precompute row counts for the filters listed in PRECOMPUTED_COUNTS so the
+    API can serve totals without running COUNT(*) on every page request.
+
+    Args:
+        db_path: Path to the SQLite database file
+        table_name: Name of the data table
+        dataset_name: Dataset name used to look up the filters to count
+    """
+    filters = PRECOMPUTED_COUNTS.get(dataset_name, [('', [])])
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {ROW_COUNTS_TABLE}")
+        conn.execute(
+            f"CREATE TABLE {ROW_COUNTS_TABLE} (where_clause TEXT, params TEXT, row_count INTEGER, "
+            "PRIMARY KEY (where_clause, params))"
+        )
+        for where_clause, params in filters:
+            where = f" WHERE {where_clause}" if where_clause else ""
+            row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}{where}", params).fetchone()[0]
+            conn.execute(
+                f"INSERT INTO {ROW_COUNTS_TABLE} (where_clause, params, row_count) VALUES (?, ?, ?)",
+                (where_clause, json.dumps(params), row_count)
+            )
+            print(f"Row count for {table_name}{where}: {row_count:,}")
+        conn.commit()
+    finally:
+        conn.close()
+
+def open_tsv(tsv_path):
+    """Open a plain or gzipped TSV file as text"""
+    if tsv_path.endswith('.gz'):
+        return gzip.open(tsv_path, 'rt', encoding='utf-8', newline='')
+    return open(tsv_path, 'r', encoding='utf-8', newline='')
+
+def read_blocks(tsv_file, chunk_size):
+    """Yield (line count, text) blocks of up to chunk_size raw lines"""
+    while True:
+        lines = list(islice(tsv_file, chunk_size))
+        if not lines:
+            return
+        yield len(lines), ''.join(lines)
+
+def sqlite_type(series, raw=None):
+    """Map a parsed pandas column to a SQLite column type
+
+    pandas parses integer columns with blank values as float64; when raw (the
+    same column read as text) shows every value written as a whole number,
+    the column is still INTEGER.
+    """
+    if series.isna().all():
+        # Nothing to go on; TEXT accepts whatever later chunks hold
+        return 'TEXT'
+    if series.dtype.kind in 'iub':
+        return 'INTEGER'
+    if series.dtype.kind == 'f':
+        if raw is not None and raw.dropna().str.strip().str.fullmatch(r'[+-]?\d+').all():
+            return 'INTEGER'
+        return 'REAL'
+    return 'TEXT'
+
+def infer_column_types(header, sample_block, dataset_name):
+    """Infer column types from the first block, then apply INGEST_COLUMN_TYPES overrides"""
+    sample = pd.read_csv(io.StringIO(sample_block), sep='\t', header=None, names=header)
+    raw = pd.read_csv(io.StringIO(sample_block), sep='\t', header=None, names=header, dtype=str)
+    column_types = {col: sqlite_type(sample[col], raw[col]) for col in header}
+    column_types.update(INGEST_COLUMN_TYPES.get(dataset_name, {}))
+    return column_types
+
+def parse_chunk(block, header, column_types):
+    """
+    Parse a block of TSV lines into row tuples for executemany. Runs in a worker process.
+
+    Returns:
+        (rows, seconds spent parsing)
+    """
+    start_time = time.perf_counter()
+    try:
+        df = pd.read_csv(io.StringIO(block), sep='\t', header=None, names=header,
+                         dtype={col: PANDAS_DTYPES[column_types[col]] for col in header})
+    except (ValueError, TypeError):
+        # A value doesn't fit its column's type; keep text as text and let the
+        # column affinity store the rest
+        df = pd.read_csv(io.StringIO(block), sep='\t', header=None, names=header,
+                         dtype={col: 'str' for col in header if column_types[col] == 'TEXT'})
+    # Missing values (empty, NaN, None, ...) are stored as NULL
+    df = df.astype(object).where(df.notna(), None)
+    rows = list(df.itertuples(index=False, name=None))
+    return rows, time.perf_counter() - start_time
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def source_identity(tsv_path):
+    """Identify a source file so a checkpoint is only resumed against the same file"""
+    stat = os.stat(tsv_path)
+    return json.dumps([os.path.abspath(tsv_path), stat.st_size, stat.st_mtime_ns])
+
+def read_checkpoint(conn, source):
+    """Return the progress row recorded for source, or None"""
+    try:
+        row = conn.execute(
+            f"SELECT lines_loaded, rows_loaded, column_types, complete FROM {INGEST_PROGRESS_TABLE} WHERE source = ?",
+            (source,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if row is None:
+        return None
+    return {'lines': row[0], 'rows': row[1], 'column_types': json.loads(row[2]), 'complete': bool(row[3])}
+
+def save_checkpoint(conn, source, state, column_types, complete=False):
+    conn.execute(f"DELETE FROM {INGEST_PROGRESS_TABLE}")
+    conn.execute(
+        f"INSERT INTO {INGEST_PROGRESS_TABLE} (source, lines_loaded, rows_loaded, column_types, complete) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (source, state['lines'], state['rows'], json.dumps(column_types), int(complete))
+    )
+
+def create_table(conn, table_name, header, column_types):
+    """(Re)create the data table and an empty progress table"""
+    columns = ', '.join(f"{quote_identifier(col)} {column_types[col]}" for col in header)
+    conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+    conn.execute(f"CREATE TABLE {table_name} ({columns})")
+    conn.execute(f"DROP TABLE IF EXISTS {INGEST_PROGRESS_TABLE}")
+    conn.execute(
+        f"CREATE TABLE {INGEST_PROGRESS_TABLE} (source TEXT, lines_loaded INTEGER, rows_loaded INTEGER, "
+        "column_types TEXT, complete INTEGER)"
+    )
+
+def write_chunks(conn, insert_sql, results, state, source, column_types, checkpoint_rows, stats):
+    """
+    Writer thread: insert parsed chunks in file order inside one transaction,
+    committing with a checkpoint every checkpoint_rows rows.
+
+    After an error the remaining chunks are drained and discarded so the
+    reader never blocks; the error is left in state['error'].
     """
-    print(f"\nConverting {tsv_path} to {db_path}")
     start_time = time.time()
+    since_checkpoint = 0
+    conn.execute("BEGIN")
+    while True:
+        item = results.get()
+        if item is None:
+            break
+        if state['error']:
+            continue
+        future, line_count = item
+        try:
+            rows, parse_seconds = future.result()
+            write_start = time.perf_counter()
+            conn.executemany(insert_sql, rows)
+            stats['write'][0] += len(rows)
+            stats['write'][1] += time.perf_counter() - write_start
+            stats['parse'][0] += len(rows)
+            stats['parse'][1] += parse_seconds
+
+            state['lines'] += line_count
+            state['rows'] += len(rows)
+            since_checkpoint += len(rows)
+            if checkpoint_rows and since_checkpoint >= checkpoint_rows:
+                save_checkpoint(conn, source, state, column_types)
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+                since_checkpoint = 0
+                print(f"Checkpoint: {state['rows']:,} rows loaded in {time.time() - start_time:.1f} seconds")
+        except BaseException as e:
+            state['error'] = e
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    if not state['error']:
+        save_checkpoint(conn, source, state, column_types)
+        conn.execute("COMMIT")
+
+def build_database_path(db_path, source):
+    """Versioned file a load is built in before it replaces db_path"""
+    version = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return f"{db_path}.{version}.tmp"
+
+def remove_database_file(db_path):
+    for path in (db_path, f"{db_path}-journal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def live_row_count(db_path, table_name):
+    """Row count of the database currently being served, or None if there isn't one"""
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
 
-    if not os.path.exists(tsv_path):
-        print(f"Error: TSV file {tsv_path} does not exist")
-        return False
+def verify_database(build_path, db_path, table_name, expected_rows, force=False):
+    """
+    Check a freshly built database before it replaces the live one.
 
-    # Get file size
-    file_size_mb = os.path.getsize(tsv_path) / (1024 * 1024)
-    print(f"File size: {file_size_mb:.2f} MB")
+    Runs PRAGMA integrity_check, compares the table's row count with the rows
+    loaded, and, unless force is set, refuses a table that shrank below
+    INGEST_MIN_ROW_RATIO of the live table (usually a truncated source file).
 
-    # Create database directory if it doesn't exist
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    Returns:
+        A list of problems; empty if the database can be swapped in
+    """
+    problems = []
+    conn = sqlite3.connect(build_path)
+    try:
+        result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        if result != ['ok']:
+            problems.append(f"integrity check failed: {'; '.join(result[:5])}")
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    finally:
+        conn.close()
+
+    if row_count != expected_rows:
+        problems.append(f"table has {row_count:,} rows, expected {expected_rows:,}")
+    if row_count == 0:
+        problems.append("table is empty")
+    live_rows = live_row_count(db_path, table_name)
+    if not force and live_rows and INGEST_MIN_ROW_RATIO and row_count < live_rows * INGEST_MIN_ROW_RATIO:
+        problems.append(f"table has {row_count:,} rows, the live database has {live_rows:,} "
+                        "(use --force to replace it anyway)")
+    return problems
+
+def swap_database(build_path, db_path):
+    """
+    Atomically replace db_path with the built database.
+
+    Readers that already have the old file open keep reading it until they
+    close it; new connections open the new file. The API's connection pool
+    and caches notice the new inode and switch over.
+    """
+    # The load ran with synchronous=OFF, so flush the file before it goes live
+    with open(build_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(build_path, db_path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def stage_rate(rows, seconds):
+    return f"{rows / seconds:,.0f}" if seconds > 0 else "n/a"
+
+def finish_swap(build_path, db_path, table_name, row_count, force):
+    """Verify a finished build and swap it in; the build file is kept if a check fails"""
+    start_time = time.time()
+    problems = verify_database(build_path, db_path, table_name, row_count, force)
+    if problems:
+        for problem in problems:
+            print(f"Error: {problem}")
+        print(f"Not replacing {db_path}; the new database was left at {build_path}")
+        return False
+    swap_database(build_path, db_path)
+    print(f"Verified and swapped in {db_path} in {time.time() - start_time:.1f} seconds")
+    return True
 
-    # Create database engine
-    engine = create_engine(f"sqlite:///{db_path}")
+def write_facets(db_path, table_name, dataset_name):
+    """
+    Materialize the distinct values and row counts of the columns in
+    FACET_COLUMNS, overall and per value of the dataset's FACET_GROUP_COLUMNS
+    column, so the API can serve facet counts without a GROUP BY over the table.
 
+    Args:
+        db_path: Path to the SQLite database file
+        table_name: Name of the data table
+        dataset_name: Dataset name used to look up the facet columns
+    """
+    conn = sqlite3.connect(db_path)
     try:
-        # Check if this is a large file
-        is_large_file = file_size_mb > 100  # Consider files > 100MB as large
+        columns = set(get_columns(conn, table_name))
+        facet_columns = [col for col in FACET_COLUMNS.get(dataset_name, []) if col in columns]
+        group_column = FACET_GROUP_COLUMNS.get(dataset_name)
+        if group_column not in columns:
+            group_column = None
+
+        conn.execute(f"DROP TABLE IF EXISTS {FACETS_TABLE}")
+        conn.execute(f"DROP TABLE IF EXISTS {FACETS_BY_GROUP_TABLE}")
+        if not facet_columns:
+            conn.commit()
+            return
+
+        start_time = time.time()
+        conn.execute(f"CREATE TABLE {FACETS_TABLE} (column_name TEXT, value, row_count INTEGER)")
+        conn.execute(
+            f"CREATE TABLE {FACETS_BY_GROUP_TABLE} (column_name TEXT, group_value, value, row_count INTEGER)"
+        )
+        for col in facet_columns:
+            conn.execute(
+                f"INSERT INTO {FACETS_TABLE} SELECT ?, {col}, COUNT(*) FROM {table_name} GROUP BY {col}", (col,)
+            )
+            if group_column:
+                conn.execute(
+                    f"INSERT INTO {FACETS_BY_GROUP_TABLE} SELECT ?, {group_column}, {col}, COUNT(*) "
+                    f"FROM {table_name} GROUP BY {group_column}, {col}", (col,)
+                )
+        conn.execute(
+            f"CREATE INDEX idx{FACETS_BY_GROUP_TABLE}_group ON {FACETS_BY_GROUP_TABLE} "
+            "(column_name, group_value, value, row_count)"
+        )
+        conn.commit()
+        print(f"Built facets for {table_name} ({', '.join(facet_columns)}) in {time.time() - start_time:.1f} seconds")
+    finally:
+        conn.close()
 
-        if is_large_file:
-            print(f"Large file detected, processing in chunks of {chunk_size:,} rows")
+def write_summary(db_path, table_name, dataset_name):
+    """
+    Materialize the per-group summary declared in DATASET_SUMMARIES: for each
+    combination of the group columns, the row count and the min, median and
+    max of each numeric column, so /api/summary reads a few summary rows
+    instead of aggregating the data rows on every request.
 
-            # Read the header first to get column names
-            header_df = pd.read_csv(tsv_path, sep='\t', nrows=1)
-            print(f"Detected {len(header_df.columns)} columns")
+    Medians are computed in the same pass with window functions: non-NULL
+    values are ranked within their group and the middle one (or the mean of
+    the middle two) is kept.
 
-            # Process in chunks
-            chunk_count = 0
-            row_count = 0
+    Args:
+        db_path: Path to the SQLite database file
+        table_name: Name of the data table
+        dataset_name: Dataset name used to look up the summary spec
+    """
+    spec = DATASET_SUMMARIES.get(dataset_name)
 
-            # Use if_exists='replace' for the first chunk, then 'append' for subsequent chunks
-            if_exists = 'replace'
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {SUMMARY_TABLE}")
+        if not spec:
+            conn.commit()
+            return
+
+        column_types = {row[1]: (row[2] or '').upper() for row in conn.execute(f"PRAGMA table_info({table_name})")}
+        group_by = spec['group_by']
+        missing = [col for col in group_by if col not in column_types]
+        if missing:
+            print(f"Skipping summary for {table_name}: missing columns {', '.join(missing)}")
+            conn.commit()
+            return
+        value_columns = spec.get('columns') or [
+            col for col, col_type in column_types.items()
+            if col not in group_by and col_type in ('INTEGER', 'REAL')
+        ]
+        value_columns = [col for col in value_columns if col in column_types]
+
+        start_time = time.time()
+        groups = ', '.join(quote_identifier(col) for col in group_by)
+        definitions = [f"{quote_identifier(col)} {column_types[col]}" for col in group_by] + ['row_count INTEGER']
+        ranked = []
+        aggregates = []
+        for index, col in enumerate(value_columns):
+            quoted = quote_identifier(col)
+            definitions += [f"{quote_identifier(col + '_min')} {column_types[col]}",
+                            f"{quote_identifier(col + '_median')} REAL",
+                            f"{quote_identifier(col + '_max')} {column_types[col]}"]
+            ranked += [f"ROW_NUMBER() OVER (PARTITION BY {groups} ORDER BY {quoted} NULLS LAST) AS _rank_{index}",
+                       f"COUNT({quoted}) OVER (PARTITION BY {groups}) AS _count_{index}"]
+            aggregates += [f"MIN({quoted})",
+                           f"AVG(CASE WHEN _rank_{index} IN ((_count_{index} + 1) / 2, (_count_{index} + 2) / 2) "
+                           f"THEN {quoted} END)",
+                           f"MAX({quoted})"]
+
+        conn.execute(f"CREATE TABLE {SUMMARY_TABLE} ({', '.join(definitions)})")
+        source_columns = ', '.join([groups] + [quote_identifier(col) for col in value_columns] + ranked)
+        conn.execute(
+            f"INSERT INTO {SUMMARY_TABLE} SELECT {', '.join([groups, 'COUNT(*)'] + aggregates)} "
+            f"FROM (SELECT {source_columns} FROM {table_name}) GROUP BY {groups}"
+        )
+        conn.execute(f"CREATE INDEX idx{SUMMARY_TABLE}_group ON {SUMMARY_TABLE} ({groups})")
+        conn.commit()
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {SUMMARY_TABLE}").fetchone()[0]
+        print(f"Built summary for {table_name} by {', '.join(group_by)} ({row_count:,} rows, "
+              f"{len(value_columns)} numeric columns) in {time.time() - start_time:.1f} seconds")
+    finally:
+        conn.close()
+
+def convert_tsv_to_sqlite(tsv_path, db_path, table_name, chunk_size=100000, dataset_name=None,
+                          workers=None, checkpoint_rows=INGEST_CHECKPOINT_ROWS, resume=False, force=False):
+    """
+    Convert a TSV file to a SQLite database with parallel parsing and a single writer.
 
-            for chunk in pd.read_csv(tsv_path, sep='\t', chunksize=chunk_size, low_memory=True):
-                chunk_count += 1
-                rows_in_chunk = len(chunk)
-                row_count += rows_in_chunk
+    The database is built in a versioned temporary file next to db_path,
+    checked with verify_database and then atomically renamed over db_path, so
+    a running API keeps serving the old data until the new file is complete.
 
-                # Clean data - replace NaN values with empty strings
-                for col in chunk.columns:
-                    chunk[col] = chunk[col].replace(['nan', 'None', 'NaN'], '')
+    The file is read in blocks of chunk_size lines, a process pool parses the
+    blocks into typed rows, and one writer thread inserts them in file order
+    with executemany. Column types are inferred from the first block (see
+    INGEST_COLUMN_TYPES) and declared on the table up front.
 
-                # Write to database
-                chunk.to_sql(table_name, engine, if_exists=if_exists, index=False)
-                if_exists = 'append'  # Use append for all subsequent chunks
+    Every checkpoint_rows rows the writer commits together with the number of
+    source lines loaded, so an interrupted load can continue with resume=True.
+    With checkpoint_rows=0 the load is a single transaction with the rollback
+    journal off, which is fastest but can't be resumed. Blocks are split on
+    newlines, so fields must not contain embedded line breaks.
 
-                # Report progress
-                elapsed_time = time.time() - start_time
-                print(f"Chunk {chunk_count}: Processed {row_count:,} rows ({rows_in_chunk:,} in this chunk) in {elapsed_time:.1f} seconds")
+    Args:
+        tsv_path: Path to the TSV file
+        db_path: Path to the SQLite database file to create
+        table_name: Name of the table to create in the database
+        chunk_size: Number of lines parsed per block
+        dataset_name: Dataset name used to look up post-load settings (defaults to table_name)
+        workers: Number of parser processes (defaults to the CPU count)
+        checkpoint_rows: Rows between checkpoints, 0 for a single transaction
+        resume: Continue from the checkpoint left by an interrupted load of the same file
+        force: Swap the new database in even if it has far fewer rows than the live one
+    """
+    print(f"\nConverting {tsv_path} to {db_path}")
+    start_time = time.time()
+    dataset_name = dataset_name or table_name
+    workers = workers or os.cpu_count() or 1
 
-                # Clean up to free memory
-                del chunk
-                gc.collect()
+    if not os.path.exists(tsv_path):
+        print(f"Error: TSV file {tsv_path} does not exist")
+        return False
 
-        else:
-            # For smaller files, process all at once
-            print("Processing entire file at once")
-            df = pd.read_csv(tsv_path, sep='\t')
+    # Get file size
+    file_size_mb = os.path.getsize(tsv_path) / (1024 * 1024)
+    print(f"File size: {file_size_mb:.2f} MB")
 
-            # Clean data - replace NaN values with empty strings
-            for col in df.columns:
-                df[col] = df[col].replace(['nan', 'None', 'NaN'], '')
+    # Create database directory if it doesn't exist
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+    source = source_identity(tsv_path)
+    if resume and os.path.exists(db_path):
+        live_conn = sqlite3.connect(db_path)
+        try:
+            live_checkpoint = read_checkpoint(live_conn, source)
+        finally:
+            live_conn.close()
+        if live_checkpoint and live_checkpoint['complete']:
+            print(f"{tsv_path} is already loaded ({live_checkpoint['rows']:,} rows), skipping")
+            return True
+
+    build_path = build_database_path(db_path, source)
+    if not resume:
+        remove_database_file(build_path)
+    print(f"Building in {build_path}")
+
+    stats = {'read': [0, 0.0], 'parse': [0, 0.0], 'write': [0, 0.0]}
+    conn = sqlite3.connect(build_path, isolation_level=None, check_same_thread=False)
 
-            # Write to database
-            df.to_sql(table_name, engine, if_exists='replace', index=False)
-            row_count = len(df)
+    try:
+        checkpoint = read_checkpoint(conn, source) if resume else None
+        if checkpoint and checkpoint['complete']:
+            # Interrupted between finishing the build and swapping it in
+            conn.close()
+            return finish_swap(build_path, db_path, table_name, checkpoint['rows'], force)
+
+        # Durability is only needed at checkpoints; without them a failed load starts over
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA journal_mode = {'TRUNCATE' if checkpoint_rows else 'OFF'}")
+
+        with open_tsv(tsv_path) as tsv_file:
+            header = tsv_file.readline().rstrip('\r\n').split('\t')
+            print(f"Detected {len(header)} columns")
+            blocks = read_blocks(tsv_file, chunk_size)
+            first_block = None
+
+            if checkpoint:
+                column_types = checkpoint['column_types']
+                deque(islice(tsv_file, checkpoint['lines']), maxlen=0)
+                state = {'lines': checkpoint['lines'], 'rows': checkpoint['rows'], 'error': None}
+                print(f"Resuming after {checkpoint['rows']:,} rows ({checkpoint['lines']:,} lines)")
+            else:
+                read_start = time.perf_counter()
+                first_block = next(blocks, None)
+                stats['read'][1] += time.perf_counter() - read_start
+                stats['read'][0] += first_block[0] if first_block else 0
+                column_types = infer_column_types(header, first_block[1] if first_block else '', dataset_name)
+                create_table(conn, table_name, header, column_types)
+                state = {'lines': 0, 'rows': 0, 'error': None}
+            print("Column types: " + ", ".join(f"{col} {column_types[col]}" for col in header))
+
+            insert_sql = f"INSERT INTO {table_name} VALUES ({', '.join('?' for _ in header)})"
+            # Bound the parsed chunks held in memory while the writer catches up
+            results = queue.Queue(maxsize=workers * 2)
+            writer = threading.Thread(
+                target=write_chunks,
+                args=(conn, insert_sql, results, state, source, column_types, checkpoint_rows, stats)
+            )
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                writer.start()
+                try:
+                    if first_block:
+                        results.put((pool.submit(parse_chunk, first_block[1], header, column_types), first_block[0]))
+                    while not state['error']:
+                        read_start = time.perf_counter()
+                        block = next(blocks, None)
+                        stats['read'][1] += time.perf_counter() - read_start
+                        if block is None:
+                            break
+                        stats['read'][0] += block[0]
+                        results.put((pool.submit(parse_chunk, block[1], header, column_types), block[0]))
+                finally:
+                    results.put(None)
+                    writer.join()
+
+        if state['error']:
+            raise state['error']
+        load_time = time.time() - start_time
+        row_count = state['rows']
+        print(f"Loaded {row_count:,} rows in {load_time:.1f} seconds with {workers} parser processes")
+        conn.execute("PRAGMA journal_mode = DELETE")
+
+        # Index the filter columns and precompute row counts served by the API
+        post_start = time.time()
+        build_indexes(build_path, table_name, dataset_name)
+        build_fts_index(build_path, table_name, dataset_name)
+        build_region_index(build_path, table_name, dataset_name)
+        write_row_counts(build_path, table_name, dataset_name)
+        write_facets(build_path, table_name, dataset_name)
+        write_summary(build_path, table_name, dataset_name)
+        post_seconds = time.time() - post_start
+
+        save_checkpoint(conn, source, state, column_types, complete=True)
+        conn.close()
+
+        # Per-stage throughput; parse time is summed over the parser processes
+        print(f"Stage rates (rows/second): read {stage_rate(stats['read'][0], stats['read'][1])}, "
+              f"parse {stage_rate(stats['parse'][0], stats['parse'][1])} per process, "
+              f"write {stage_rate(stats['write'][0], stats['write'][1])}, "
+              f"indexes and counts {stage_rate(row_count, post_seconds)}")
 
         # Calculate total time
         total_time = time.time() - start_time
         print(f"Conversion complete: {row_count:,} rows processed in {total_time:.1f} seconds")
         print(f"Average processing speed: {row_count/total_time:.1f} rows/second")
-        print(f"Database file created at: {db_path}")
 
-        return True
+        return finish_swap(build_path, db_path, table_name, row_count, force)
 
     except Exception as e:
         print(f"Error converting {tsv_path}: {e}")
+        if checkpoint_rows:
+            print("Run again with --resume to continue from the last checkpoint")
         return False
 
     finally:
-        # Always dispose of the engine
-        engine.dispose()
+        conn.close()
+
+def rebuild_database(db_path, table_name, dataset_name, force=False):
+    """
+    Rebuild the indexes and derived tables of an existing database.
+
+    The live file is copied with the SQLite backup API, rebuilt in the copy
+    and swapped in with finish_swap, the same way a full load is, so the API
+    never reads a half-rebuilt database.
+    """
+    start_time = time.time()
+    build_path = build_database_path(db_path, f"indexes:{db_path}")
+    remove_database_file(build_path)
+    source = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    target = sqlite3.connect(build_path)
+    try:
+        source.backup(target)
+        row_count = target.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    print(f"Copied {db_path} ({row_count:,} rows) in {time.time() - start_time:.1f} seconds")
+
+    try:
+        build_indexes(build_path, table_name, dataset_name)
+        build_fts_index(build_path, table_name, dataset_name)
+        build_region_index(build_path, table_name, dataset_name)
+        write_row_counts(build_path, table_name, dataset_name)
+        write_facets(build_path, table_name, dataset_name)
+        write_summary(build_path, table_name, dataset_name)
+    except Exception as e:
+        print(f"Error rebuilding {db_path}: {e}")
+        remove_database_file(build_path)
+        return False
+    return finish_swap(build_path, db_path, table_name, row_count, force)
+
+def configured_databases():
+    """Yield (dataset_name, db_path, table_name) for configured databases that exist"""
+    for dataset_name, db_path in DATABASE_FILES.items():
+        if os.path.exists(db_path):
+            yield dataset_name, db_path, DATASET_TABLES[dataset_name]
+        else:
+            print(f"Skipping {dataset_name}: {db_path} does not exist")
 
 def main():
     """
     Main function to scan for TSV files and convert them to SQLite databases.
     """
+    parser = argparse.ArgumentParser(description='Convert TSV files to SQLite databases')
+    parser.add_argument('--indexes-only', action='store_true',
+                        help='Rebuild indexes, row counts, facets and summaries on a copy of each database and swap it in')
+    parser.add_argument('--check', action='store_true',
+                        help='Report API queries that fall back to a full table scan')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parser processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=100000,
+                        help='Lines parsed per chunk (default: 100,000)')
+    parser.add_argument('--checkpoint-rows', type=int, default=INGEST_CHECKPOINT_ROWS,
+                        help='Rows between resumable checkpoints; 0 loads in one transaction')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue interrupted loads from their last checkpoint and skip completed ones')
+    parser.add_argument('--force', action='store_true',
+                        help='Replace live databases even if the new table is much smaller')
+    args = parser.parse_args()
+
+    if args.indexes_only:
+        failed = 0
+        for dataset_name, db_path, table_name in configured_databases():
+            print(f"\nBuilding indexes for {db_path}")
+            if not rebuild_database(db_path, table_name, dataset_name, force=args.force):
+                failed += 1
+        if failed:
+            print(f"\n{failed} databases were not rebuilt")
+            sys.exit(1)
+        return
+
+    if args.check:
+        full_scans = 0
+        for dataset_name, db_path, table_name in configured_databases():
+            full_scans += check_query_plans(db_path, table_name, dataset_name)
+        if full_scans:
+            print(f"\n{full_scans} API queries fall back to a full table scan")
+            sys.exit(1)
+        print("\nAll filtered API queries use an index")
+        return
+
     data_dir = 'data'
 
     # Ensure data directory exists
@@ -149,7 +920,8 @@ def main():
 
         # Convert TSV to SQLite
         tsv_path = os.path.join(data_dir, tsv_file)
-        if convert_tsv_to_sqlite(tsv_path, db_path, table_name):
+        if convert_tsv_to_sqlite(tsv_path, db_path, table_name, chunk_size=args.chunk_size, dataset_name=dataset_name,
+                                 workers=args.workers, checkpoint_rows=args.checkpoint_rows, resume=args.resume, force=args.force):
             success_count += 1
 
     print(f"\nConversion summary: {success_count} of {len(tsv_files)} files successfully converted")
@@ -0,0 +1,254 @@
+"""
+Per-worker SQLite connection pool.
+
+Connections are opened read-only (URI ``mode=ro``), tuned with the PRAGMAs
+from ``db_config.SQLITE_PRAGMAS`` and kept per dataset so a request reuses a
+warm connection (parsed schema, page cache, mmap) instead of opening the
+database file again.
+
+Connections must never cross a fork, so gunicorn creates the pool in
+``post_fork`` and the pool also refuses to hand out connections that were
+opened by a different process.
+
+The ingest script replaces a database by renaming a new file over the old
+one. Each connection remembers the file (device and inode) it opened; once
+the path points at a different file, idle connections to the old one are
+closed and checked-out ones are closed when they are released, so requests
+in flight finish on the old data and the next ones open the new file.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+
+from data.db_config import (
+    DATABASE_FILES,
+    DATABASE_TIMEOUT,
+    POOL_MAX_IDLE,
+    POOL_HEALTH_CHECK_INTERVAL,
+    QUERY_PROGRESS_INTERVAL,
+    SQLITE_PRAGMAS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimeout(Exception):
+    """A query was interrupted because its deadline passed"""
+
+
+def database_file_id(db_path):
+    """Identify the file currently at db_path; changes when a new file is renamed into place"""
+    st = os.stat(db_path)
+    return (st.st_dev, st.st_ino)
+
+
+def open_readonly_connection(db_path):
+    """Open a read-only SQLite connection with the configured PRAGMAs applied"""
+    uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, timeout=DATABASE_TIMEOUT, check_same_thread=False)
+    for pragma, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """Pool of read-only SQLite connections keyed by dataset name"""
+
+    def __init__(self, database_files=None, max_idle=POOL_MAX_IDLE,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL):
+        self.database_files = dict(database_files or DATABASE_FILES)
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.pid = os.getpid()
+        self._idle = {name: [] for name in self.database_files}
+        self._file_ids = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'checkouts': 0,
+            'health_checks': 0,
+            'health_check_failures': 0,
+            'discarded': 0,
+            'reopened': 0,
+            'timeouts': 0
+        }
+
+    def _current_file_id(self, dataset_name):
+        try:
+            return database_file_id(self.database_files[dataset_name])
+        except OSError:
+            return None
+
+    def _connect(self, dataset_name, file_id):
+        conn = open_readonly_connection(self.database_files[dataset_name])
+        with self._lock:
+            self._stats['created'] += 1
+            self._file_ids[conn] = file_id
+        return conn
+
+    def _drop_stale(self, dataset_name, file_id):
+        """Close idle connections opened on a file that is no longer at the dataset's path"""
+        with self._lock:
+            self._check_pid()
+            idle = self._idle[dataset_name]
+            stale = [entry for entry in idle if self._file_ids.get(entry[0]) != file_id]
+            if not stale:
+                return
+            self._idle[dataset_name] = [entry for entry in idle if self._file_ids.get(entry[0]) == file_id]
+            self._stats['reopened'] += 1
+        logger.info(f"Database file for {dataset_name} was replaced; closing {len(stale)} idle connections")
+        for conn, _ in stale:
+            self._discard(conn)
+
+    def _is_healthy(self, conn):
+        with self._lock:
+            self._stats['health_checks'] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def _check_pid(self):
+        """Forget connections inherited from a parent process"""
+        if self.pid != os.getpid():
+            # Do not close them: the parent still owns the underlying handles
+            self._idle = {name: [] for name in self.database_files}
+            self._file_ids = {}
+            self.pid = os.getpid()
+
+    def acquire(self, dataset_name):
+        """Check a connection out of the pool, opening a new one if none is idle"""
+        if dataset_name not in self.database_files:
+            raise KeyError(f"Unknown dataset: {dataset_name}")
+
+        file_id = self._current_file_id(dataset_name)
+        self._drop_stale(dataset_name, file_id)
+        while True:
+            with self._lock:
+                self._check_pid()
+                self._stats['checkouts'] += 1
+                idle = self._idle[dataset_name]
+                entry = idle.pop() if idle else None
+
+            if entry is None:
+                return self._connect(dataset_name, file_id)
+
+            conn, last_used = entry
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                with self._lock:
+                    self._stats['reused'] += 1
+                return conn
+
+            self._discard(conn)
+            with self._lock:
+                # Only count the checkout that actually hands out a connection
+                self._stats['checkouts'] -= 1
+
+    def release(self, dataset_name, conn, broken=False):
+        """Return a connection to the pool, closing it if broken or the pool is full"""
+        if conn.in_transaction:
+            conn.rollback()
+        # A connection to a file that has since been replaced is not worth keeping
+        stale = dataset_name in self.database_files and self._file_ids.get(conn) != self._current_file_id(dataset_name)
+        with self._lock:
+            self._check_pid()
+            idle = self._idle.get(dataset_name)
+            if not broken and not stale and idle is not None and len(idle) < self.max_idle:
+                idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._stats['discarded'] += 1
+            self._file_ids.pop(conn, None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @contextmanager
+    def connection(self, dataset_name, deadline=None):
+        """Context manager yielding a pooled connection for a dataset
+
+        With a deadline (a time.monotonic() value), a progress handler aborts
+        any statement still running when it passes, and the abort surfaces as
+        QueryTimeout. The connection itself stays usable and goes back to the pool.
+        """
+        conn = self.acquire(dataset_name)
+        broken = False
+        if deadline is not None:
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, QUERY_PROGRESS_INTERVAL)
+        try:
+            yield conn
+        except sqlite3.OperationalError as e:
+            if deadline is not None and time.monotonic() > deadline and 'interrupted' in str(e):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise QueryTimeout(f"Query on {dataset_name} was interrupted after its deadline passed") from e
+            broken = True
+            raise
+        except sqlite3.DatabaseError:
+            broken = True
+            raise
+        finally:
+            if deadline is not None:
+                conn.set_progress_handler(None, 0)
+            self.release(dataset_name, conn, broken=broken)
+
+    def close_all(self):
+        """Close every idle connection owned by this process"""
+        with self._lock:
+            if self.pid != os.getpid():
+                self._check_pid()
+                return
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle = {name: [] for name in self.database_files}
+            self._file_ids = {}
+        for conn, _ in entries:
+            conn.close()
+
+    def stats(self):
+        """Return pool counters and reuse rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = {name: len(idle) for name, idle in self._idle.items()}
+        stats['pid'] = self.pid
+        stats['reuse_rate'] = round(stats['reused'] / stats['checkouts'], 4) if stats['checkouts'] else 0.0
+        return stats
+
+
+_pool = None
+
+
+def init_pool(database_files=None):
+    """Create (or recreate) the connection pool for the current process"""
+    global _pool
+    if _pool is not None:
+        _pool.close_all()
+    _pool = ConnectionPool(database_files)
+    logger.info(f"Initialized SQLite connection pool (pid: {_pool.pid})")
+    return _pool
+
+
+def get_pool():
+    """Return the current process's pool, creating it lazily"""
+    if _pool is None or _pool.pid != os.getpid():
+        return init_pool()
+    return _pool
+
+
+def close_pool():
+    """Close all pooled connections held by the current process"""
+    if _pool is not None:
+        _pool.close_all()
@@ -0,0 +1,220 @@
+"""
+Declarative column filters for the data and export endpoints.
+
+The filters each dataset accepts are declared in DATASET_FILTERS
+(data/db_config.py). Request arguments are parsed into a shape, the filtered
+columns with their operators and IN list sizes, plus the parameter values.
+The shape is compiled into parameterized WHERE clauses once and cached, so
+requests differing only in values share the same SQL text (and the same
+count cache and prepared statement cache entries).
+
+Every operator compiles to a comparison SQLite can answer with an index on
+the column: prefixes become a half-open range instead of LIKE 'AB%', which
+SQLite would only seek with case_sensitive_like. Long IN lists and stored gene
+panels are bound as one JSON array and read with json_each, which SQLite
+still answers with one index seek per value. Region filters (DATASET_REGIONS)
+look up the rowids of overlapping intervals in the R*Tree built at ingest.
+"""
+
+import re
+import json
+import functools
+
+from data.db_config import (
+    DATASET_TABLES,
+    DATASET_FILTERS,
+    DATASET_REGIONS,
+    DEFAULT_FILTERS,
+    FILTER_PLAN_CACHE_SIZE,
+    FILTER_IN_JSON_MIN_VALUES,
+    REGION_CHROMS_TABLE,
+    get_region_table
+)
+
+_TRUE_VALUES = ('1', 'true', 'yes')
+_FALSE_VALUES = ('0', 'false', 'no')
+
+
+def convert_value(value, value_type, param):
+    """Convert a query parameter value to the filter's declared type; raises ValueError"""
+    if value_type == 'int':
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f'{param} must be an integer')
+    if value_type == 'float':
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f'{param} must be a number')
+    return value
+
+
+def prefix_upper_bound(prefix):
+    """Return the smallest string greater than every string starting with prefix, or None"""
+    last = ord(prefix[-1])
+    if last >= 0x10FFFF:
+        return None
+    return prefix[:-1] + chr(last + 1)
+
+
+_REGION_PATTERN = re.compile(r'^([^:\s]+):([\d,]+)(?:-([\d,]+))?$')
+
+
+def parse_region(value):
+    """Parse chrom:start-end (or chrom:position) into (chrom, start, end); raises ValueError"""
+    match = _REGION_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError('region must be chrom:start-end')
+    chrom = match.group(1)
+    start = int(match.group(2).replace(',', ''))
+    end = int(match.group(3).replace(',', '')) if match.group(3) else start
+    if start > end:
+        raise ValueError('region start must not be after its end')
+    return chrom, start, end
+
+
+def alternate_chrom(chrom):
+    """The other common spelling of a chromosome name: chr1 <-> 1"""
+    return chrom[3:] if chrom.lower().startswith('chr') else 'chr' + chrom
+
+
+def in_condition(column, values):
+    """Return (sql, params) matching column against a list of values, as one JSON parameter if it is long"""
+    if len(values) > FILTER_IN_JSON_MIN_VALUES:
+        return f"{column} IN (SELECT value FROM json_each(?))", [json.dumps(values, separators=(',', ':'))]
+    return f"{column} IN ({','.join('?' for _ in values)})", list(values)
+
+
+def _plain_values(args, names, split):
+    values = []
+    for name in names:
+        for value in args.getlist(name):
+            values.extend(value.split(',') if split else [value])
+    return [value.strip() for value in values if value.strip()]
+
+
+def parse_filters(dataset_name, args, columns=None, panels=None, region_index=True):
+    """Read a dataset's filters from request args
+
+    Returns (shape, params): shape is a tuple of (column, operator, number of
+    values) and params the values in clause order; region filters hold the
+    dataset name in place of a column. Filters on columns missing from columns
+    (when given) are ignored. panels resolves a ?panel= id to a stored gene
+    panel (see panels.PanelStore.resolve). Without region_index, regions are
+    matched by comparing the interval columns instead of with the R*Tree.
+    Raises ValueError for bad values.
+    """
+    shape = []
+    params = []
+
+    def add(column, op, values):
+        shape.append((column, op, len(values)))
+        params.extend(values)
+
+    defaults = DEFAULT_FILTERS.get(dataset_name, {})
+    for column, value in defaults.items():
+        add(column, 'eq', [value])
+
+    for column, spec in DATASET_FILTERS.get(dataset_name, {}).items():
+        if column in defaults or (columns is not None and column not in columns):
+            continue
+        ops = spec['ops']
+        value_type = spec.get('type', 'text')
+        param = spec.get('param', column)
+
+        if ops[0] in ('eq', 'in'):
+            values = _plain_values(args, [param] + spec.get('aliases', []), split=ops[0] == 'in')
+            if ops[0] == 'eq':
+                values = values[:1]
+            values = [convert_value(value, value_type, param) for value in values]
+            if len(values) == 1:
+                add(column, 'eq', values)
+            elif len(values) > FILTER_IN_JSON_MIN_VALUES:
+                add(column, 'in_json', [json.dumps(values, separators=(',', ':'))])
+            elif values:
+                add(column, 'in', values)
+
+        if 'panel' in ops:
+            panel = args.get('panel', '').strip()
+            if panel:
+                if panels is None:
+                    raise ValueError('gene panels are not available')
+                add(column, 'in_json', [panels(panel)['genes_json']])
+
+        if 'range' in ops:
+            for suffix, op in (('_min', 'min'), ('_max', 'max')):
+                value = args.get(column + suffix, '').strip()
+                if value:
+                    add(column, op, [convert_value(value, value_type, column + suffix)])
+
+        if 'prefix' in ops:
+            prefix = args.get(column + '_prefix', '').strip()
+            if prefix:
+                upper = prefix_upper_bound(prefix)
+                if upper is None:
+                    add(column, 'min', [prefix])
+                else:
+                    add(column, 'prefix', [prefix, upper])
+
+        if 'null' in ops:
+            value = args.get(column + '_null', '').strip().lower()
+            if value in _TRUE_VALUES:
+                add(column, 'null', [])
+            elif value in _FALSE_VALUES:
+                add(column, 'notnull', [])
+            elif value:
+                raise ValueError(f'{column}_null must be true or false')
+
+    region = DATASET_REGIONS.get(dataset_name)
+    value = args.get('region', '').strip()
+    if region and value and (columns is None or all(col in columns for col in region.values())):
+        chrom, start, end = parse_region(value)
+        # Overlap: the interval starts before the region ends and ends after it starts
+        add(dataset_name, 'region' if region_index else 'region_scan', [chrom, alternate_chrom(chrom), end, start])
+
+    return tuple(shape), params
+
+
+@functools.lru_cache(maxsize=FILTER_PLAN_CACHE_SIZE)
+def compile_filters(shape):
+    """Compile a filter shape into a tuple of parameterized WHERE clauses"""
+    clauses = []
+    for column, op, count in shape:
+        if op == 'eq':
+            clauses.append(f"{column} = ?")
+        elif op == 'in':
+            clauses.append(f"{column} IN ({','.join('?' for _ in range(count))})")
+        elif op == 'in_json':
+            clauses.append(f"{column} IN (SELECT value FROM json_each(?))")
+        elif op == 'min':
+            clauses.append(f"{column} >= ?")
+        elif op == 'max':
+            clauses.append(f"{column} <= ?")
+        elif op == 'prefix':
+            clauses.append(f"{column} >= ? AND {column} < ?")
+        elif op == 'null':
+            clauses.append(f"{column} IS NULL")
+        elif op == 'notnull':
+            clauses.append(f"{column} IS NOT NULL")
+        elif op == 'region':
+            clauses.append(
+                f"rowid IN (SELECT id FROM {get_region_table(DATASET_TABLES[column])} WHERE chrom_lo IN "
+                f"(SELECT chrom_id FROM {REGION_CHROMS_TABLE} WHERE chrom IN (?, ?)) "
+                "AND pos_lo <= ? AND pos_hi >= ?)"
+            )
+        elif op == 'region_scan':
+            region = DATASET_REGIONS[column]
+            clauses.append(
+                f"{region['chrom']} IN (?, ?) AND MIN({region['start']}, {region['end']}) <= ? "
+                f"AND MAX({region['start']}, {region['end']}) >= ?"
+            )
+        else:
+            raise ValueError(f'unknown filter operator {op}')
+    return tuple(clauses)
+
+
+def build_filters(dataset_name, args, columns=None, panels=None, region_index=True):
+    """Return (where_clauses, where_params) for the filters in request args"""
+    shape, params = parse_filters(dataset_name, args, columns, panels, region_index)
+    return list(compile_filters(shape)), params
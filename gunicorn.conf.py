@@ -11,8 +11,13 @@ bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker processes
+# gthread workers serve several requests at once, so one slow export or search
+# doesn't hold up every request queued behind it. Each thread checks out its
+# own pooled SQLite connection, and queries running longer than
+# REQUEST_TIMEOUT (data/db_config.py) are interrupted before the 30 s timeout.
 workers = 4
-worker_class = "sync"
+worker_class = "gthread"
+threads = 4
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -45,9 +50,15 @@ def worker_int(worker):
 
 def pre_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    # Connections opened by the preloaded app in the master must not be shared with workers
+    import db_pool
+    db_pool.close_pool()
 
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+    # Give each worker its own read-only SQLite connection pool
+    import db_pool
+    db_pool.init_pool()
 
 def post_worker_init(worker):
     worker.log.info("Worker initialized (pid: %s)", worker.pid)
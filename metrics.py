@@ -0,0 +1,199 @@
+"""
+Request timing instrumentation for the API.
+
+Stages of a request (count query, page query, row serialization, JSON
+encoding, response write) are timed with ``timed``. Each measurement goes
+into a histogram exposed in the Prometheus text format, and into the
+current request's timings, which the app sends back as a Server-Timing
+header.
+
+Metrics are kept per process: with several gunicorn workers, each scrape of
+/api/metrics reports the worker that answered it.
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_INF_LABEL = 'le="+Inf"'
+
+# Stage durations of the request being handled on this thread, or None outside a request
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Cumulative histogram with a fixed set of label names"""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total, count) for key, (counts, total, count) in self._series.items())
+        for key, counts, total, count in series:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, _INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'rnaseq_stage_duration_seconds',
+    'Time spent in each stage of handling a request',
+    ('stage', 'dataset')
+)
+REQUEST_SECONDS = Histogram(
+    'rnaseq_request_duration_seconds',
+    'Time from the start of a request until its response was written',
+    ('endpoint', 'method', 'status')
+)
+SLOW_QUERIES = Counter(
+    'rnaseq_slow_queries_total',
+    'Queries that took longer than the slow query threshold',
+    ('dataset', 'stage')
+)
+QUERY_TIMEOUTS = Counter(
+    'rnaseq_query_timeouts_total',
+    'Queries interrupted because the request deadline passed',
+    ('dataset',)
+)
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, SLOW_QUERIES, QUERY_TIMEOUTS]
+
+
+class Timer:
+    """Elapsed time of a timed block, readable after it finishes"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+
+
+@contextmanager
+def timed(stage, dataset=''):
+    """Time a block as a stage of the current request"""
+    timer = Timer()
+    try:
+        yield timer
+    finally:
+        timer.elapsed = time.perf_counter() - timer.start
+        record_stage(stage, timer.elapsed, dataset)
+
+
+def record_stage(stage, seconds, dataset=''):
+    STAGE_SECONDS.observe(seconds, stage=stage, dataset=dataset)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def start_request():
+    """Start collecting stage timings for the request on this thread"""
+    _request_timings.set({})
+
+
+def finish_request():
+    """Stop collecting stage timings and return the ones recorded"""
+    timings = _request_timings.get()
+    _request_timings.set(None)
+    return timings or {}
+
+
+def server_timing_header(timings, total=None):
+    """Format stage timings (seconds) as a Server-Timing header value in milliseconds"""
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"app;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+
+def explain_query_plan(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN steps for a statement as one string"""
+    try:
+        return ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    except Exception as e:
+        return f"(plan unavailable: {e})"
+
+
+def log_slow_query(conn, dataset, stage, sql, params, seconds, threshold):
+    """Log a query slower than threshold with its plan, and count it"""
+    if threshold is None or seconds < threshold:
+        return
+    SLOW_QUERIES.inc(dataset=dataset, stage=stage)
+    shown_params = list(params)[:20]
+    logger.warning(
+        f"Slow {stage} query on {dataset} took {seconds * 1000:.1f} ms: {sql} params={shown_params} "
+        f"plan: {explain_query_plan(conn, sql, params)}"
+    )
+
+
+def render_metrics():
+    """Render every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
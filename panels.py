@@ -0,0 +1,118 @@
+"""
+Gene panel store.
+
+A gene panel is a list of gene symbols saved once with POST /api/panels and
+then referenced by id (?panel=<id>) on the data, export, facets and batch
+endpoints, so a 2,000-gene filter is a short, cacheable URL instead of 2,000
+query parameters.
+
+Panels are content-addressed: the id is a hash of the sorted, de-duplicated
+symbols, so saving the same panel twice returns the same id and a panel never
+changes once stored. They are kept in a small SQLite file shared by all
+workers, with the most recently used ones decoded in memory per worker.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PANEL_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def normalize_genes(genes):
+    """Return the sorted unique symbols of a list, or of a string separated by commas or whitespace"""
+    if isinstance(genes, str):
+        genes = re.split(r'[\s,]+', genes)
+    if not isinstance(genes, list) or not all(isinstance(gene, str) for gene in genes):
+        raise ValueError('genes must be a list of strings or a newline-separated string')
+    return sorted({gene.strip() for gene in genes if gene.strip()})
+
+
+def panel_id(genes):
+    """Content hash of a normalized gene list"""
+    return hashlib.sha256('\n'.join(genes).encode('utf-8')).hexdigest()[:32]
+
+
+class PanelStore:
+    """Gene panels in a SQLite file, with an in-process LRU of decoded panels
+
+    Entries returned by get are shared and must not be modified: 'genes' is the
+    symbol list and 'genes_json' the same list as a JSON array, ready to bind
+    to a json_each query.
+    """
+
+    def __init__(self, path, max_genes, cache_entries=256):
+        self.path = path
+        self.max_genes = max_genes
+        self.cache_entries = cache_entries
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _connection(self):
+        """Open the panel file lazily, once per process, so connections never cross a fork"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS panels (id TEXT PRIMARY KEY, genes TEXT, size INTEGER, created_at REAL)"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _remember(self, entry):
+        self._cache[entry['id']] = entry
+        self._cache.move_to_end(entry['id'])
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    def save(self, genes):
+        """Store a panel and return its entry; raises ValueError for an empty or oversized panel"""
+        genes = normalize_genes(genes)
+        if not genes:
+            raise ValueError('a panel needs at least one gene')
+        if len(genes) > self.max_genes:
+            raise ValueError(f'a panel holds at most {self.max_genes} genes')
+        entry = {'id': panel_id(genes), 'genes': genes, 'size': len(genes),
+                 'genes_json': json.dumps(genes, separators=(',', ':'))}
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR IGNORE INTO panels (id, genes, size, created_at) VALUES (?, ?, ?, ?)",
+                (entry['id'], entry['genes_json'], entry['size'], time.time())
+            )
+            self._remember(entry)
+        logger.info(f"Stored gene panel {entry['id']} with {entry['size']} genes")
+        return entry
+
+    def get(self, key):
+        """Return the entry of a stored panel, or None if there is none with that id"""
+        if not PANEL_ID_PATTERN.match(key):
+            return None
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return entry
+            row = self._connection().execute("SELECT genes, size FROM panels WHERE id = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            entry = {'id': key, 'genes': json.loads(row[0]), 'size': row[1], 'genes_json': row[0]}
+            self._remember(entry)
+            return entry
+
+    def resolve(self, key):
+        """Return the entry of a panel referenced by a request; raises ValueError if it is unknown"""
+        entry = self.get(key)
+        if entry is None:
+            raise ValueError(f'unknown gene panel {key}')
+        return entry
@@ -0,0 +1,259 @@
+"""
+Response cache for the JSON API.
+
+Entries hold the encoded response body together with the version of the
+database file it was computed from, so a refreshed database invalidates them
+without any explicit purge.
+
+Two backends share the same get/set/stats interface: an in-process LRU, and a
+SQLite key-value file (by default in /dev/shm) shared by all gunicorn workers
+on the host, so a response computed by one worker is served by every worker.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUResponseCache:
+    """In-process LRU cache bounded by the total size of the cached bodies"""
+
+    def __init__(self, max_bytes, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'skipped': 0}
+
+    def get(self, key, version):
+        """Return (etag, body) for key if cached for this database version, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] != version:
+                # Computed from an older database file
+                self._remove(key)
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1], entry[2]
+
+    def set(self, key, version, etag, body):
+        """Store a response body, evicting least recently used entries to stay within max_bytes"""
+        if len(body) > self.max_entry_bytes:
+            with self._lock:
+                self._stats['skipped'] += 1
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        _, _, body = self._entries.pop(key)
+        self._size -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._size
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = 'memory'
+        return stats
+
+
+class SharedResponseCache:
+    """Cross-process cache stored in a local SQLite key-value file
+
+    eviction selects which entries go first once the cache exceeds max_bytes:
+    'lru' drops the least recently read entries, 'ttl' drops the entries
+    closest to expiry. With a ttl, entries also expire after that many seconds.
+    Hit/miss counters are per process; entries and bytes are shared.
+    """
+
+    # Only record a read in the shared file once per entry in this many seconds
+    TOUCH_INTERVAL = 5.0
+
+    def __init__(self, path, max_bytes, max_entry_bytes=None, eviction='lru', ttl=None):
+        if eviction not in ('lru', 'ttl'):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        if eviction == 'ttl' and not ttl:
+            raise ValueError("TTL eviction requires a ttl")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.eviction = eviction
+        self.ttl = ttl
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'skipped': 0, 'errors': 0}
+
+    def _connection(self):
+        """Open the cache file lazily, once per process, so connections never cross a fork"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Losing cache writes on a crash is harmless
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, version TEXT, etag TEXT, "
+                "body BLOB, size INTEGER, expires_at REAL, accessed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache (expires_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('bytes', 0)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key, version):
+        """Return (etag, body) for key if cached for this database version, else None"""
+        now = time.time()
+        version = json.dumps(version)
+        with self._lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT version, etag, body, expires_at, accessed_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._stats['misses'] += 1
+                    return None
+                entry_version, etag, body, expires_at, accessed_at = row
+                if entry_version != version or (expires_at is not None and expires_at <= now):
+                    conn.execute("BEGIN IMMEDIATE")
+                    self._delete(conn, key)
+                    conn.execute("COMMIT")
+                    self._stats['stale'] += 1
+                    self._stats['misses'] += 1
+                    return None
+                if now - accessed_at > self.TOUCH_INTERVAL:
+                    conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._stats['hits'] += 1
+                return etag, bytes(body)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared response cache read failed: {e}")
+                self._rollback()
+                self._stats['errors'] += 1
+                self._stats['misses'] += 1
+                return None
+
+    def set(self, key, version, etag, body):
+        """Store a response body and evict entries until the cache fits in max_bytes"""
+        if len(body) > self.max_entry_bytes:
+            with self._lock:
+                self._stats['skipped'] += 1
+            return
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                self._delete(conn, key)
+                conn.execute(
+                    "INSERT INTO cache (key, version, etag, body, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, json.dumps(version), etag, body, len(body), expires_at, now)
+                )
+                conn.execute("UPDATE meta SET value = value + ? WHERE name = 'bytes'", (len(body),))
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Shared response cache write failed: {e}")
+                self._rollback()
+                self._stats['errors'] += 1
+
+    def _rollback(self):
+        if self._conn is not None and self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def _delete(self, conn, key):
+        row = conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            conn.execute("UPDATE meta SET value = value - ? WHERE name = 'bytes'", (row[0],))
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then entries in eviction order while over max_bytes"""
+        if self.ttl:
+            expired_bytes, expired_count = conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM cache WHERE expires_at <= ?", (now,)
+            ).fetchone()
+            if expired_count:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+                conn.execute("UPDATE meta SET value = value - ? WHERE name = 'bytes'", (expired_bytes,))
+                self._stats['evictions'] += expired_count
+
+        order = 'accessed_at' if self.eviction == 'lru' else 'expires_at'
+        total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        while total > self.max_bytes:
+            victims = conn.execute(f"SELECT key, size FROM cache ORDER BY {order} LIMIT 16").fetchall()
+            if not victims:
+                break
+            for victim_key, size in victims:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM cache WHERE key = ?", (victim_key,))
+                total -= size
+                self._stats['evictions'] += 1
+            conn.execute("UPDATE meta SET value = ? WHERE name = 'bytes'", (total,))
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cache")
+            conn.execute("UPDATE meta SET value = 0 WHERE name = 'bytes'")
+            conn.execute("COMMIT")
+
+    def stats(self):
+        """Return this process's hit/miss counters and the shared cache size"""
+        with self._lock:
+            stats = dict(self._stats)
+            try:
+                conn = self._connection()
+                stats['entries'] = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+                stats['bytes'] = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+            except sqlite3.Error as e:
+                stats['error'] = str(e)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = 'shared'
+        stats['eviction'] = self.eviction
+        return stats
+
+
+def create_response_cache(backend, max_bytes, max_entry_bytes=None, path=None, eviction='lru', ttl=None):
+    """Create the response cache backend named in the configuration ('memory' or 'shared')"""
+    if backend == 'memory':
+        return LRUResponseCache(max_bytes, max_entry_bytes)
+    if backend == 'shared':
+        return SharedResponseCache(path, max_bytes, max_entry_bytes, eviction=eviction, ttl=ttl)
+    raise ValueError(f"Unknown response cache backend: {backend}")
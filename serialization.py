@@ -0,0 +1,198 @@
+"""
+Column-wise row serialization and JSON encoding for API responses.
+
+Rows are sanitized one column at a time using the column's declared type,
+instead of inspecting every value of every row in Python. Non-finite floats
+are rendered as the strings "Infinity", "-Infinity" and "NaN", which is what
+the viewers expect.
+
+Besides row dicts, results can be laid out as column arrays with a schema
+header, or encoded as an Arrow IPC stream when pyarrow is installed.
+"""
+
+import re
+import math
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Bare tokens the C encoder emits for non-finite floats; string literals are
+# matched first so their contents are never rewritten
+_NON_FINITE_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|(-?Infinity|NaN)')
+
+
+def column_affinity(declared_type):
+    """Return the SQLite type affinity for a declared column type"""
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return 'INTEGER'
+    if any(name in declared_type for name in ('CHAR', 'CLOB', 'TEXT')):
+        return 'TEXT'
+    if not declared_type or 'BLOB' in declared_type:
+        return 'BLOB'
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'REAL'
+    return 'NUMERIC'
+
+
+def sanitize_value(value):
+    """Make a single value of unknown type JSON-ready"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+        if math.isnan(value):
+            return "NaN"
+    return value
+
+
+def _is_finite_float_column(values):
+    """True if a column holds only finite numbers, checked with a single C-level sum"""
+    try:
+        # Any NaN or infinity makes the sum non-finite; an overflowing sum of
+        # large finite values is a false alarm that only costs the slow path
+        return math.isfinite(sum(values))
+    except TypeError:
+        # NULLs or text stored in the column
+        return False
+
+
+def sanitize_columns(columns, column_names, column_types):
+    """Sanitize a list of column value sequences in place and return it
+
+    TEXT and INTEGER columns only need NULLs replaced by empty strings, and
+    only when the column actually contains one. REAL columns are left as they
+    are when a single sum shows every value is finite. Anything else, and any
+    column failing those checks, is sanitized value by value.
+    """
+    for index, values in enumerate(columns):
+        affinity = column_types.get(column_names[index])
+        if affinity in ('TEXT', 'INTEGER'):
+            if None in values:
+                columns[index] = ['' if value is None else value for value in values]
+        elif affinity == 'REAL' and _is_finite_float_column(values):
+            continue
+        else:
+            columns[index] = [sanitize_value(value) for value in values]
+    return columns
+
+
+def rows_to_columns(rows, column_count):
+    """Transpose row tuples into one tuple per column"""
+    if not rows:
+        return [() for _ in range(column_count)]
+    return list(zip(*rows))
+
+
+def columns_to_records(columns, column_names, column_types):
+    """Sanitize columns and zip them into one dict per row"""
+    columns = sanitize_columns(list(columns), column_names, column_types)
+    return [dict(zip(column_names, values)) for values in zip(*columns)]
+
+
+def serialize_rows(rows, column_names, column_types):
+    """Convert row tuples to dicts, sanitizing whole columns at once"""
+    if not rows:
+        return []
+    return columns_to_records(rows_to_columns(rows, len(column_names)), column_names, column_types)
+
+
+def serialize_columns(columns, column_names, column_types):
+    """Lay out columns as a schema header plus one JSON array per column"""
+    columns = sanitize_columns(list(columns), column_names, column_types)
+    schema = [{'name': name, 'type': column_types.get(name, 'BLOB')} for name in column_names]
+    return schema, [list(values) for values in columns]
+
+
+# Arrow types for each SQLite type affinity; NUMERIC and BLOB columns are inferred
+_ARROW_TYPES = {
+    'INTEGER': 'int64',
+    'REAL': 'float64',
+    'TEXT': 'string'
+}
+
+
+def _arrow_array(values, affinity):
+    """Build an Arrow array for a column, falling back to strings for mixed storage classes"""
+    type_name = _ARROW_TYPES.get(affinity)
+    try:
+        return pa.array(values, type=getattr(pa, type_name)() if type_name else None)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def encode_arrow_stream(columns, column_names, column_types, metadata=None):
+    """Encode columns as an Arrow IPC stream; NULL, NaN and Infinity are kept natively
+
+    metadata is stored as string key/value pairs on the schema.
+    """
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+    arrays = [_arrow_array(list(values), column_types.get(name)) for name, values in zip(column_names, columns)]
+    schema_metadata = {str(key): '' if value is None else str(value) for key, value in (metadata or {}).items()}
+    batch = pa.record_batch(arrays, names=list(column_names))
+    batch = batch.replace_schema_metadata(schema_metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_available():
+    return pa is not None
+
+
+def _has_bare_non_finite(encoded):
+    """Cheap check for unquoted NaN/Infinity tokens using substring counts
+
+    Every occurrence inside a "NaN", "Infinity" or "-Infinity" string is
+    accounted for; any other occurrence (possibly inside a longer string)
+    sends the output through the full rewrite, which is always correct.
+    """
+    if 'NaN' in encoded and encoded.count('NaN') != encoded.count('"NaN"'):
+        return True
+    if 'Infinity' in encoded:
+        return encoded.count('Infinity') != encoded.count('"Infinity"') + encoded.count('"-Infinity"')
+    return False
+
+
+def _quote_non_finite(match):
+    token = match.group(1)
+    return f'"{token}"' if token else match.group(0)
+
+
+def _default(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return DefaultJSONProvider.default(value)
+
+
+class SafeJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that never emits invalid JSON for NaN or Infinity
+
+    Encoding runs in the C encoder with allow_nan enabled and bytes decoded by
+    default(). Non-finite floats that reach it without going through
+    serialize_rows come out as bare tokens, which are quoted afterwards; the
+    full rewrite only runs when a substring count finds one.
+    """
+
+    default = staticmethod(_default)
+
+    def dumps(self, obj, **kwargs):
+        kwargs['allow_nan'] = True
+        encoded = super().dumps(obj, **kwargs)
+        if _has_bare_non_finite(encoded):
+            encoded = _NON_FINITE_TOKEN.sub(_quote_non_finite, encoded)
+        return encoded